@@ -1,7 +1,7 @@
 import os
 import logging
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 class Config:
     """Configuration management for the bot using environment variables.
@@ -12,10 +12,24 @@ class Config:
       DATABASE_PATH             (default: ./data/videos.db)
       SESSION_LENGTH_MINUTES    (default: 30)
       LOG_LEVEL                 (default: INFO)
+      WEBHOOK_URL               (optional; public HTTPS base URL, enables webhook mode)
+      WEBHOOK_PORT              (default: 8443)
+      WEBHOOK_SECRET            (optional; checked against Telegram's secret token header)
     """
 
     def __init__(self):
         self._validate_required()
+        # Environment is read once; values are plain attributes afterwards
+        self.bot_token: str = os.environ["TELEGRAM_BOT_TOKEN"]
+        self.ifly_chat_id: int = int(os.environ["TELEGRAM_IFLY_CHAT_ID"])
+        self.database_path: str = os.getenv("DATABASE_PATH", "./data/videos.db")
+        self.session_length_minutes: int = self._parse_int("SESSION_LENGTH_MINUTES", 30)
+        self.log_level: str = os.getenv("LOG_LEVEL", "INFO").upper()
+        # Webhook mode when a public URL is configured, long polling otherwise
+        self.webhook_url: Optional[str] = os.getenv("WEBHOOK_URL", "").rstrip("/") or None
+        self.webhook_port: int = self._parse_int("WEBHOOK_PORT", 8443)
+        self.webhook_secret: Optional[str] = os.getenv("WEBHOOK_SECRET") or None
+        self.use_webhook: bool = self.webhook_url is not None
 
     def _validate_required(self):
         missing = []
@@ -26,25 +40,9 @@ class Config:
         if missing:
             raise RuntimeError(f"Missing required environment variables: {', '.join(missing)}")
 
-    @property
-    def bot_token(self) -> str:
-        return os.environ["TELEGRAM_BOT_TOKEN"]
-
-    @property
-    def ifly_chat_id(self) -> int:
-        return int(os.environ["TELEGRAM_IFLY_CHAT_ID"])
-
-    @property
-    def database_path(self) -> str:
-        return os.getenv("DATABASE_PATH", "./data/videos.db")
-
-    @property
-    def session_length_minutes(self) -> int:
+    @staticmethod
+    def _parse_int(name: str, default: int) -> int:
         try:
-            return int(os.getenv("SESSION_LENGTH_MINUTES", "30"))
+            return int(os.getenv(name, str(default)))
         except ValueError:
-            return 30
-
-    @property
-    def log_level(self) -> str:
-        return os.getenv("LOG_LEVEL", "INFO").upper()
+            return default
@@ -1,39 +1,275 @@
 import sqlite3
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from itertools import groupby
+from operator import itemgetter
+from typing import List, Dict, Iterator, Optional, Sequence, Tuple
 from pathlib import Path
 
+log = logging.getLogger(__name__)
+
+
+# Organized library nodes, as returned by Database.get_organized_videos
+@dataclass(slots=True)
+class Video:
+    id: int
+    camera_name: str
+    file_id: str
+    file_name: str
+
+
+@dataclass(slots=True)
+class Flight:
+    flight_number: str
+    length: int
+    videos: List[Video]
+
+
+@dataclass(slots=True)
+class Session:
+    time_slot: str
+    flights: List[Flight]
+
+
+@dataclass(slots=True)
+class Day:
+    date: int
+    sessions: List[Session]
+
+
+# Bump whenever _initialize_schema gains new tables, indexes or migrations.
+SCHEMA_VERSION = 8
+
+# Sort order of cameras inside a flight; unknown cameras sort last.
+CAMERA_RANKS = {'Door': 1, 'Centerline': 2, 'Firsttimer': 3, 'Sideline': 4}
+DEFAULT_CAMERA_RANK = 5
+
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER UNIQUE NOT NULL,
+    username TEXT COLLATE NOCASE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_chat_id INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    flight_date INTEGER NOT NULL,
+    time_slot TEXT NOT NULL,
+    flight_number TEXT NOT NULL,
+    camera_name TEXT NOT NULL,
+    camera_rank INTEGER NOT NULL DEFAULT 5,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_chat_id) REFERENCES users (chat_id),
+    UNIQUE(file_name, user_chat_id)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target_chat_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    expires_at INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS system_data (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS user_stats (
+    chat_id INTEGER PRIMARY KEY,
+    total_duration INTEGER NOT NULL,
+    first_flight INTEGER
+);
+"""
+
+INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_videos_user_order
+    ON videos(user_chat_id, flight_date, time_slot, flight_number, camera_rank);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username
+    ON users(username) WHERE username IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_sessions_exp
+    ON sessions(expires_at DESC);
+"""
+
+# user_stats is kept in step with videos by triggers, so every write path
+# (single, bulk, delete) updates it in the same transaction. Created after the
+# migrations because rebuilding the videos table drops its triggers; dropped
+# first so a schema bump replaces definitions stored by older versions.
+TRIGGER_DDL = """
+DROP TRIGGER IF EXISTS trg_videos_stats_insert;
+DROP TRIGGER IF EXISTS trg_videos_stats_delete;
+CREATE TRIGGER IF NOT EXISTS trg_videos_stats_insert AFTER INSERT ON videos
+BEGIN
+    INSERT INTO user_stats (chat_id, total_duration, first_flight)
+    VALUES (new.user_chat_id, new.duration, new.flight_date)
+    ON CONFLICT(chat_id) DO UPDATE SET
+        total_duration = total_duration + excluded.total_duration,
+        -- two-argument MIN() is NULL if either side is (user deleted every video)
+        first_flight = COALESCE(MIN(first_flight, excluded.first_flight), excluded.first_flight);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_videos_stats_delete AFTER DELETE ON videos
+BEGIN
+    UPDATE user_stats SET
+        total_duration = total_duration - old.duration,
+        first_flight = (SELECT MIN(flight_date) FROM videos WHERE user_chat_id = old.user_chat_id)
+    WHERE chat_id = old.user_chat_id;
+END;
+"""
+SQL_REBUILD_USER_STATS = (
+    "INSERT INTO user_stats (chat_id, total_duration, first_flight) "
+    "SELECT user_chat_id, SUM(duration), MIN(flight_date) FROM videos GROUP BY user_chat_id"
+)
+
+# SQL statements are kept as module-level constants so every call passes the
+# identical string and hits the connection's prepared-statement cache.
+# Upsert in place (keeps id/created_at) and skip the write when nothing changed;
+# BINARY so a case-only change in the username is still stored
+SQL_ADD_USER = (
+    "INSERT INTO users (chat_id, username) VALUES (?, ?) "
+    "ON CONFLICT(chat_id) DO UPDATE SET username = excluded.username "
+    "WHERE username IS NOT excluded.username COLLATE BINARY"
+)
+SQL_RELEASE_USERNAME = "UPDATE users SET username = NULL WHERE username = ? AND chat_id <> ?"
+SQL_GET_USER_BY_USERNAME = "SELECT chat_id, username FROM users WHERE username = ?"
+SQL_GET_USER_BY_CHAT_ID = "SELECT chat_id, username FROM users WHERE chat_id = ?"
+SQL_ADD_VIDEO = (
+    "INSERT OR IGNORE INTO videos "
+    "(user_chat_id, file_id, file_name, duration, flight_date, time_slot, flight_number, camera_name, camera_rank) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+# Rows per transaction for bulk inserts; past ~10k the gains flatten out.
+BULK_INSERT_CHUNK_SIZE = 10_000
+SQL_DELETE_VIDEO_BY_ID = "DELETE FROM videos WHERE user_chat_id = ? AND id = ?"
+SQL_GET_VIDEOS_BY_USER = (
+    "SELECT id, flight_date, time_slot, flight_number, camera_name, file_id, file_name, duration "
+    "FROM videos WHERE user_chat_id = ? "
+    "ORDER BY flight_date, time_slot, flight_number, camera_rank"
+)
+SQL_GET_USER_STATS = "SELECT total_duration, first_flight FROM user_stats WHERE chat_id = ?"
+SQL_CREATE_SESSION = "INSERT OR REPLACE INTO sessions (target_chat_id, username, expires_at) VALUES (?, ?, ?)"
+SQL_GET_ACTIVE_SESSION = (
+    "SELECT target_chat_id, username, expires_at FROM sessions "
+    "WHERE expires_at > ? ORDER BY expires_at DESC LIMIT 1"
+)
+SQL_END_SESSION = "UPDATE sessions SET expires_at = 0 WHERE expires_at > ?"
+SQL_PURGE_EXPIRED_SESSIONS = "DELETE FROM sessions WHERE expires_at <= ?"
+SQL_SET_SYSTEM_VALUE = (
+    "INSERT OR REPLACE INTO system_data (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)"
+)
+SQL_GET_ALL_SYSTEM_VALUES = "SELECT key, value FROM system_data"
+
+
 class Database:
     """Database operations for the iFLY videos bot."""
     
     def __init__(self, db_path: str):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Two long-lived connections shared by all worker threads: one for writes
+        # and one for reads, each serialized by its own lock. Under WAL a reader
+        # never blocks on the writer, so library browsing doesn't queue behind
+        # uploads. Autocommit mode: single-row writes commit on their own,
+        # batches use explicit BEGIN/COMMIT.
+        self._write_lock = threading.Lock()
+        self._conn = self._connect()
+        self._apply_pragmas()
         self._ensure_connection()
+        self._read_lock = threading.Lock()
+        self._read_conn = self._connect()
+        self._apply_connection_pragmas(self._read_conn)
+        with self._write_lock:
+            # Drop sessions that expired while the bot was down so the table and
+            # idx_sessions_exp stay small; a still-running session survives restarts
+            self._conn.execute(SQL_PURGE_EXPIRED_SESSIONS, (int(time.time()),))
+            # system_data is tiny and only written by this process: keep it in memory
+            self._sysdata: Dict[str, str] = {
+                row['key']: row['value'] for row in self._conn.execute(SQL_GET_ALL_SYSTEM_VALUES)
+            }
     
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, cached_statements=512, isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _apply_pragmas(self):
+        """Tune the connection once: WAL journal, relaxed fsync, in-memory temp, 64MB cache."""
+        # page_size only takes effect on a fresh file, so it must precede the WAL switch
+        self._conn.execute("PRAGMA page_size=4096")
+        # journal_mode persists in the file; the rest are per-connection settings
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._apply_connection_pragmas(self._conn)
+
+    @staticmethod
+    def _apply_connection_pragmas(conn: sqlite3.Connection):
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA busy_timeout=60000")
+
     def _ensure_connection(self):
         """Ensure database file and schema exist (idempotent)."""
-        # Always (re)apply schema to ensure required tables exist
-        self._initialize_schema()
+        with self._write_lock:
+            # Skip the DDL + migration checks when the stored schema is current
+            user_version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if user_version == SCHEMA_VERSION:
+                return
+            self._initialize_schema()
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
     def _initialize_schema(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn
+        # Base tables in a single call
+        conn.executescript(SCHEMA_DDL)
+        # Perform migrations after ensuring base schema
+        try:
+            self._migrate_videos_camera_rank(conn)
+        except Exception as e:
+            log.warning(f"Migration warning: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+        try:
+            self._migrate_videos_unique_constraint(conn)
+        except Exception as e:
+            log.warning(f"Migration warning: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+        try:
+            self._migrate_users_username_nocase(conn)
+        except Exception as e:
+            log.warning(f"Migration warning: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+        # Indexes and triggers go last since migrations may rebuild the tables they cover
+        conn.executescript(INDEX_DDL)
+        conn.executescript(TRIGGER_DDL)
+        # Recompute the denormalized stats from scratch: cheap, and heals any drift
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM user_stats")
+        conn.execute(SQL_REBUILD_USER_STATS)
+        conn.execute("COMMIT")
+        # Refresh planner statistics so the new indexes get picked up
+        conn.execute("ANALYZE")
+
+    def _migrate_videos_unique_constraint(self, conn):
+        """Migrate videos table UNIQUE(file_name,user_chat_id) -> UNIQUE(file_id,user_chat_id)."""
         cursor = conn.cursor()
-        # Users table
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER UNIQUE NOT NULL,
-                username TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
-        # Videos table
+        # Detect the legacy unique combo straight from the stored table definition
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='videos'")
+        row = cursor.fetchone()
+        if not row or "UNIQUE(file_name,user_chat_id)" not in "".join(row[0].split()):
+            return
+        # Rebuild table
+        cursor.execute("BEGIN TRANSACTION")
         cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS videos (
+            CREATE TABLE IF NOT EXISTS videos_new (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_chat_id INTEGER NOT NULL,
                 file_id TEXT NOT NULL,
@@ -43,360 +279,263 @@ class Database:
                 time_slot TEXT NOT NULL,
                 flight_number TEXT NOT NULL,
                 camera_name TEXT NOT NULL,
+                camera_rank INTEGER NOT NULL DEFAULT 5,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_chat_id) REFERENCES users (chat_id),
-                UNIQUE(file_name, user_chat_id)
+                UNIQUE(file_id, user_chat_id)
             )
             """
         )
-        # Sessions table
         cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                target_chat_id INTEGER NOT NULL,
-                username TEXT NOT NULL,
-                expires_at INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            INSERT OR IGNORE INTO videos_new (id,user_chat_id,file_id,file_name,duration,flight_date,time_slot,flight_number,camera_name,camera_rank,created_at)
+            SELECT id,user_chat_id,file_id,file_name,duration,flight_date,time_slot,flight_number,camera_name,camera_rank,created_at FROM videos
             """
         )
-        # System data
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS system_data (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
+        cursor.execute("DROP TABLE videos")
+        cursor.execute("ALTER TABLE videos_new RENAME TO videos")
+        cursor.execute("COMMIT")
+
+    def _migrate_videos_camera_rank(self, conn):
+        """Add videos.camera_rank (persisted camera sort order) and backfill it."""
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(videos)")
+        if any(col[1] == "camera_rank" for col in cursor.fetchall()):
+            return
+        cursor.execute("BEGIN TRANSACTION")
+        cursor.execute(f"ALTER TABLE videos ADD COLUMN camera_rank INTEGER NOT NULL DEFAULT {DEFAULT_CAMERA_RANK}")
+        cursor.executemany(
+            "UPDATE videos SET camera_rank = ? WHERE camera_name = ?",
+            [(rank, name) for name, rank in CAMERA_RANKS.items()]
         )
-        conn.commit()
-        # Perform migrations after ensuring base schema
-        try:
-            self._migrate_videos_unique_constraint(conn)
-        except Exception as e:
-            print(f"Migration warning: {e}")
-        conn.close()
+        # The ordering index used to end on camera_name; it is rebuilt on camera_rank
+        cursor.execute("DROP INDEX IF EXISTS idx_videos_user_order")
+        cursor.execute("COMMIT")
 
-    def _migrate_videos_unique_constraint(self, conn):
-        """Migrate videos table UNIQUE(file_name,user_chat_id) -> UNIQUE(file_id,user_chat_id)."""
+    def _migrate_users_username_nocase(self, conn):
+        """Migrate users.username TEXT -> TEXT COLLATE NOCASE (case-insensitive, indexable lookups)."""
         cursor = conn.cursor()
-        # Detect existing indexes referencing file_name & user_chat_id as unique combo
-        cursor.execute("PRAGMA index_list(videos)")
-        indexes = cursor.fetchall()
-        needs_migration = False
-        for idx in indexes:
-            idx_name = idx[1]
-            cursor.execute("PRAGMA index_info(%s)" % idx_name)
-            cols = [r[2] for r in cursor.fetchall()]
-            if set(cols) == {"file_name", "user_chat_id"}:
-                # confirm uniqueness changed target
-                needs_migration = True
-                break
-        if not needs_migration:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='users'")
+        row = cursor.fetchone()
+        if not row or "COLLATE NOCASE" in row[0].upper():
             return
         # Rebuild table
         cursor.execute("BEGIN TRANSACTION")
         cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS videos_new (
+            CREATE TABLE IF NOT EXISTS users_new (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_chat_id INTEGER NOT NULL,
-                file_id TEXT NOT NULL,
-                file_name TEXT NOT NULL,
-                duration INTEGER NOT NULL,
-                flight_date INTEGER NOT NULL,
-                time_slot TEXT NOT NULL,
-                flight_number TEXT NOT NULL,
-                camera_name TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_chat_id) REFERENCES users (chat_id),
-                UNIQUE(file_id, user_chat_id)
+                chat_id INTEGER UNIQUE NOT NULL,
+                username TEXT COLLATE NOCASE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             """
         )
+        # Case-only duplicates would break the unique index: the newest row keeps the
+        # username, older ones release it (like SQL_RELEASE_USERNAME), no user is dropped
         cursor.execute(
             """
-            INSERT OR IGNORE INTO videos_new (id,user_chat_id,file_id,file_name,duration,flight_date,time_slot,flight_number,camera_name,created_at)
-            SELECT id,user_chat_id,file_id,file_name,duration,flight_date,time_slot,flight_number,camera_name,created_at FROM videos
+            UPDATE users SET username = NULL
+            WHERE username IS NOT NULL
+              AND id NOT IN (SELECT MAX(id) FROM users GROUP BY username COLLATE NOCASE)
             """
         )
-        cursor.execute("DROP TABLE videos")
-        cursor.execute("ALTER TABLE videos_new RENAME TO videos")
+        cursor.execute(
+            """
+            INSERT INTO users_new (id,chat_id,username,created_at)
+            SELECT id,chat_id,username,created_at FROM users
+            """
+        )
+        cursor.execute("DROP TABLE users")
+        cursor.execute("ALTER TABLE users_new RENAME TO users")
         cursor.execute("COMMIT")
     
     def get_connection(self):
-        """Get database connection."""
-        return sqlite3.connect(self.db_path)
+        """Get database connection (the shared long-lived connection)."""
+        return self._conn
+
+    def close(self):
+        """Close the shared connections."""
+        with self._read_lock:
+            self._read_conn.close()
+        with self._write_lock:
+            self._conn.close()
     
     # User operations
     def add_user(self, chat_id: int, username: str = None) -> bool:
         """Add or update user."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO users (chat_id, username)
-                VALUES (?, ?)
-            ''', (chat_id, username))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error adding user: {e}")
-            return False
-        finally:
-            conn.close()
+        with self._write_lock:
+            try:
+                try:
+                    self._conn.execute(SQL_ADD_USER, (chat_id, username))
+                except sqlite3.IntegrityError:
+                    # Username moved over from another (stale) account: take it over
+                    self._conn.execute("BEGIN")
+                    try:
+                        self._conn.execute(SQL_RELEASE_USERNAME, (username, chat_id))
+                        self._conn.execute(SQL_ADD_USER, (chat_id, username))
+                        self._conn.execute("COMMIT")
+                    except Exception:
+                        self._conn.execute("ROLLBACK")
+                        raise
+                return True
+            except Exception:
+                log.exception("Error adding user")
+                return False
     
     def get_user_by_username(self, username: str) -> Optional[Dict]:
         """Get user by username."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('SELECT chat_id, username FROM users WHERE LOWER(username) = LOWER(?)', (username,))
-            row = cursor.fetchone()
-            if row:
-                return {'chat_id': row[0], 'username': row[1]}
-            return None
-        finally:
-            conn.close()
+        with self._read_lock:
+            row = self._read_conn.execute(SQL_GET_USER_BY_USERNAME, (username,)).fetchone()
+            return dict(row) if row else None
     
     def get_user_by_chat_id(self, chat_id: int) -> Optional[Dict]:
         """Get user by chat_id."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('SELECT chat_id, username FROM users WHERE chat_id = ?', (chat_id,))
-            row = cursor.fetchone()
-            if row:
-                return {'chat_id': row[0], 'username': row[1]}
-            return None
-        finally:
-            conn.close()
+        with self._read_lock:
+            row = self._read_conn.execute(SQL_GET_USER_BY_CHAT_ID, (chat_id,)).fetchone()
+            return dict(row) if row else None
     
     # Video operations
     def add_video(self, user_chat_id: int, file_id: str, file_name: str, duration: int,
                   flight_date: int, time_slot: str, flight_number: str, camera_name: str) -> bool:
         """Add video to database."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT OR IGNORE INTO videos 
-                (user_chat_id, file_id, file_name, duration, flight_date, time_slot, flight_number, camera_name)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_chat_id, file_id, file_name, duration, flight_date, time_slot, flight_number, camera_name))
-            conn.commit()
-            return cursor.rowcount > 0
-        except Exception as e:
-            print(f"Error adding video: {e}")
-            return False
-        finally:
-            conn.close()
+        with self._write_lock:
+            try:
+                camera_rank = CAMERA_RANKS.get(camera_name, DEFAULT_CAMERA_RANK)
+                cursor = self._conn.execute(SQL_ADD_VIDEO, (user_chat_id, file_id, file_name, duration, flight_date,
+                                                            time_slot, flight_number, camera_name, camera_rank))
+                return cursor.rowcount > 0
+            except Exception:
+                log.exception("Error adding video")
+                return False
+
+    def add_videos_bulk(self, rows: Sequence[Tuple]) -> int:
+        """Add many videos using one transaction per chunk.
+
+        Each row is (user_chat_id, file_id, file_name, duration, flight_date,
+        time_slot, flight_number, camera_name). Returns the number of rows inserted.
+        """
+        inserted = 0
+        with self._write_lock:
+            try:
+                for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+                    self._conn.execute("BEGIN")
+                    cursor = self._conn.executemany(SQL_ADD_VIDEO, (
+                        (*row, CAMERA_RANKS.get(row[7], DEFAULT_CAMERA_RANK))
+                        for row in rows[start:start + BULK_INSERT_CHUNK_SIZE]
+                    ))
+                    self._conn.execute("COMMIT")
+                    # rowcount sums sqlite3_changes(), which leaves out the stats trigger writes
+                    inserted += cursor.rowcount
+            except Exception:
+                log.exception("Error adding videos in bulk")
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+            return inserted
 
     def delete_video_by_id(self, user_chat_id: int, video_id: int) -> bool:
         """Delete a single video by its DB id for a user."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                DELETE FROM videos WHERE user_chat_id = ? AND id = ?
-            ''', (user_chat_id, video_id))
-            conn.commit()
-            return cursor.rowcount > 0
-        except Exception as e:
-            print(f"Error deleting video by id: {e}")
-            return False
-        finally:
-            conn.close()
+        with self._write_lock:
+            try:
+                cursor = self._conn.execute(SQL_DELETE_VIDEO_BY_ID, (user_chat_id, video_id))
+                return cursor.rowcount > 0
+            except Exception:
+                log.exception("Error deleting video by id")
+                return False
     
+    def _iter_videos_for_user(self, chat_id: int) -> Iterator[sqlite3.Row]:
+        """Iterate a user's video rows in library order (caller must hold the read lock)."""
+        return self._read_conn.execute(SQL_GET_VIDEOS_BY_USER, (chat_id,))
+
     def get_videos_by_user(self, chat_id: int) -> List[Dict]:
         """Get all videos for a user organized by date and session."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                SELECT id, flight_date, time_slot, flight_number, camera_name, file_id, file_name, duration
-                FROM videos
-                WHERE user_chat_id = ?
-                ORDER BY flight_date, time_slot, flight_number, 
-                    CASE camera_name 
-                        WHEN 'Door' THEN 1
-                        WHEN 'Centerline' THEN 2
-                        WHEN 'Firsttimer' THEN 3
-                        WHEN 'Sideline' THEN 4
-                        ELSE 5
-                    END
-            ''', (chat_id,))
-            
-            videos = []
-            for row in cursor.fetchall():
-                videos.append({
-                    'id': row[0],
-                    'flight_date': row[1],
-                    'time_slot': row[2],
-                    'flight_number': row[3],
-                    'camera_name': row[4],
-                    'file_id': row[5],
-                    'file_name': row[6],
-                    'duration': row[7]
-                })
-            return videos
-        finally:
-            conn.close()
+        with self._read_lock:
+            return [dict(row) for row in self._iter_videos_for_user(chat_id)]
     
     def get_organized_videos(self, chat_id: int) -> Dict:
-        """Get videos organized in the same structure as the legacy system."""
-        videos = self.get_videos_by_user(chat_id)
-        organized = {'days': []}
-        
-        days_dict = {}
+        """Get videos organized as {'days': [Day -> Session -> Flight -> Video]}."""
+        # Rows arrive ordered by (flight_date, time_slot, flight_number, camera_rank),
+        # so each level is a contiguous run: group in a single streaming pass
+        days = []
+        with self._read_lock:
+            rows = self._iter_videos_for_user(chat_id)
+            for date, day_rows in groupby(rows, key=itemgetter('flight_date')):
+                sessions = []
+                for time_slot, session_rows in groupby(day_rows, key=itemgetter('time_slot')):
+                    flights = []
+                    for flight_number, flight_rows in groupby(session_rows, key=itemgetter('flight_number')):
+                        flight_rows = list(flight_rows)
+                        flights.append(Flight(
+                            flight_number,
+                            flight_rows[0]['duration'],
+                            [Video(video['id'], video['camera_name'], video['file_id'], video['file_name'])
+                             for video in flight_rows],
+                        ))
+                    sessions.append(Session(time_slot, flights))
+                days.append(Day(date, sessions))
         
-        for video in videos:
-            date = video['flight_date']
-            time_slot = video['time_slot']
-            flight_number = video['flight_number']
-            
-            # Get or create day
-            if date not in days_dict:
-                days_dict[date] = {'date': date, 'sessions': []}
-            
-            day = days_dict[date]
-            
-            # Get or create session
-            session = next((s for s in day['sessions'] if s['time_slot'] == time_slot), None)
-            if not session:
-                session = {'time_slot': time_slot, 'flights': []}
-                day['sessions'].append(session)
-            
-            # Get or create flight
-            flight = next((f for f in session['flights'] if f['flight_number'] == flight_number), None)
-            if not flight:
-                flight = {'flight_number': flight_number, 'length': video['duration'], 'videos': []}
-                session['flights'].append(flight)
-            
-            # Add video
-            flight['videos'].append({
-                'id': video['id'],
-                'camera_name': video['camera_name'],
-                'file_id': video['file_id'],
-                'file_name': video['file_name']
-            })
-        
-        # Sort everything
-        organized['days'] = sorted(days_dict.values(), key=lambda x: x['date'])
-        for day in organized['days']:
-            day['sessions'].sort(key=lambda x: x['time_slot'])
-            for session in day['sessions']:
-                session['flights'].sort(key=lambda x: x['flight_number'])
-        
-        return organized
+        return {'days': days}
     
     def get_user_stats(self, chat_id: int) -> Dict:
         """Get user statistics."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            # Total flight time
-            cursor.execute('SELECT SUM(duration) FROM videos WHERE user_chat_id = ?', (chat_id,))
-            total_time = cursor.fetchone()[0] or 0
-            
-            # Days since first flight
-            cursor.execute('SELECT MIN(flight_date) FROM videos WHERE user_chat_id = ?', (chat_id,))
-            first_flight = cursor.fetchone()[0]
-            days_since_first = 0
-            if first_flight:
-                days_since_first = (datetime.now().timestamp() - first_flight) / 86400
-            
-            return {
-                'total_flight_time': total_time,
-                'days_since_first_flight': days_since_first
-            }
-        finally:
-            conn.close()
+        with self._read_lock:
+            # Precomputed by the videos triggers: a single primary-key lookup
+            row = self._read_conn.execute(SQL_GET_USER_STATS, (chat_id,)).fetchone()
+        total_time, first_flight = (row[0], row[1]) if row else (0, None)
+        days_since_first = 0
+        if first_flight:
+            days_since_first = (time.time() - first_flight) / 86400
+        
+        return {
+            'total_flight_time': total_time,
+            'days_since_first_flight': days_since_first
+        }
     
     # Session operations
     def create_session(self, target_chat_id: int, username: str, duration_minutes: int) -> bool:
         """Create authentication session."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            expires_at = int((datetime.now() + timedelta(minutes=duration_minutes)).timestamp())
-            cursor.execute('''
-                INSERT OR REPLACE INTO sessions (target_chat_id, username, expires_at)
-                VALUES (?, ?, ?)
-            ''', (target_chat_id, username, expires_at))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error creating session: {e}")
-            return False
-        finally:
-            conn.close()
+        now = int(time.time())
+        expires_at = now + duration_minutes * 60
+        with self._write_lock:
+            try:
+                # Opportunistically drop ended/expired sessions so the table stays small
+                self._conn.execute(SQL_PURGE_EXPIRED_SESSIONS, (now,))
+                self._conn.execute(SQL_CREATE_SESSION, (target_chat_id, username, expires_at))
+                return True
+            except Exception:
+                log.exception("Error creating session")
+                return False
     
     def get_active_session(self) -> Optional[Dict]:
         """Get active session if any."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            now = int(datetime.now().timestamp())
-            cursor.execute('''
-                SELECT target_chat_id, username, expires_at
-                FROM sessions
-                WHERE expires_at > ?
-                ORDER BY expires_at DESC
-                LIMIT 1
-            ''', (now,))
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'target_chat_id': row[0],
-                    'username': row[1],
-                    'expires_at': row[2]
-                }
-            return None
-        finally:
-            conn.close()
+        now = int(time.time())
+        with self._read_lock:
+            row = self._read_conn.execute(SQL_GET_ACTIVE_SESSION, (now,)).fetchone()
+        return dict(row) if row else None
     
     def end_session(self) -> bool:
-        """End current session."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('DELETE FROM sessions')
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error ending session: {e}")
-            return False
-        finally:
-            conn.close()
+        """End current session (expire it in place rather than deleting rows)."""
+        now = int(time.time())
+        with self._write_lock:
+            try:
+                self._conn.execute(SQL_END_SESSION, (now,))
+                return True
+            except Exception:
+                log.exception("Error ending session")
+                return False
     
     # System data operations
     def set_system_value(self, key: str, value: str) -> bool:
         """Set system value."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO system_data (key, value, updated_at)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-            ''', (key, value))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error setting system value: {e}")
-            return False
-        finally:
-            conn.close()
+        with self._write_lock:
+            try:
+                self._conn.execute(SQL_SET_SYSTEM_VALUE, (key, value))
+                self._sysdata[key] = value
+                return True
+            except Exception:
+                log.exception("Error setting system value")
+                return False
     
     def get_system_value(self, key: str) -> Optional[str]:
-        """Get system value."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('SELECT value FROM system_data WHERE key = ?', (key,))
-            row = cursor.fetchone()
-            return row[0] if row else None
-        finally:
-            conn.close()
+        """Get system value (served from the in-memory copy)."""
+        return self._sysdata.get(key)
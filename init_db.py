@@ -1,70 +1,23 @@
-import sqlite3
-import os
 from pathlib import Path
 
+from database import Database
+
 def init_database():
     """Initialize the SQLite database with required tables."""
-    
+
     # Ensure data directory exists
     data_dir = Path("data")
     data_dir.mkdir(exist_ok=True)
-    
+
     db_path = data_dir / "videos.db"
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chat_id INTEGER UNIQUE NOT NULL,
-            username TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create videos table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_chat_id INTEGER NOT NULL,
-            file_id TEXT NOT NULL,
-            file_name TEXT NOT NULL,
-            duration INTEGER NOT NULL,
-            flight_date INTEGER NOT NULL,
-            time_slot TEXT NOT NULL,
-            flight_number TEXT NOT NULL,
-            camera_name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_chat_id) REFERENCES users (chat_id),
-            UNIQUE(file_name, user_chat_id)
-        )
-    ''')
-    
-    # Create sessions table for iFLY chat authentication
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            target_chat_id INTEGER NOT NULL,
-            username TEXT NOT NULL,
-            expires_at INTEGER NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create system_data table for menu messages
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS system_data (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    
+
+    # Tables, indexes, migrations and PRAGMAs are defined once in Database.
+    # Opening it creates the file with page_size=4096 in WAL mode (persisted
+    # for every later connection), applies the schema and stamps
+    # user_version, so the bot's own startup skips the DDL afterwards.
+    db = Database(str(db_path))
+    db.close()
+
     print(f"Database initialized at {db_path}")
 
 if __name__ == "__main__":
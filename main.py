@@ -1,15 +1,30 @@
 import logging
 import asyncio
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Dict, Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
+from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
+from telegram.ext import ApplicationBuilder, Defaults, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
 
 from config import Config
 from database import Database
-from utils import parse_filename, format_flight_time, format_days_count, escape_markdown
+from utils import parse_filename, format_date, format_flight_time, format_days_count, escape_markdown
 from ui import generate_tree_text, create_navigation_keyboard, create_session_view_keyboard, create_flight_view_keyboard
 
+try:
+    import orjson
+except ImportError:  # optional speedup, the stdlib parser is used without it
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # optional speedup (not available on Windows), asyncio's own loop otherwise
+    uvloop = None
+
 # Initialize configuration and database
 config = Config()
 db = Database(config.database_path)
@@ -21,21 +36,274 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+# Max number of users whose organized library is kept in memory
+LIBRARY_CACHE_SIZE = 100
+# Seconds a cached library is trusted; guards against writes made outside this process
+LIBRARY_CACHE_TTL = 30
+# Seconds to collect videos arriving together (e.g. an album) into one INSERT transaction
+UPLOAD_BATCH_WINDOW = 0.5
+# Max background Telegram calls (message deletes) in flight at once
+BACKGROUND_API_CONCURRENCY = 20
+# Seconds shutdown waits for background work (pending uploads, deletes) to finish
+SHUTDOWN_DRAIN_TIMEOUT = 5
+# Long-poll window for getUpdates: Telegram holds the request open until an update arrives
+POLLING_TIMEOUT = timedelta(seconds=30)
+# system_data key holding the iFLY chat menu message id
+MENU_MESSAGE_KEY = "ifly_menu_message_id"
+
+# Static keyboards, built once (PTB telegram objects are immutable, so sharing is safe)
+START_MENU_KB = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🎥 Browse Videos", callback_data="n:l"),
+        InlineKeyboardButton("📊 My Stats", callback_data="stats")
+    ]
+])
+SESSION_MENU_KB = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🎥 Browse Videos", callback_data="n:l"),
+        InlineKeyboardButton("📊 My Stats", callback_data="stats")
+    ],
+    [
+        InlineKeyboardButton("🛑 End Session", callback_data="end_session")
+    ]
+])
+BACK_HOME_KB = InlineKeyboardMarkup([[InlineKeyboardButton("← Back", callback_data="home")]])
+END_SESSION_KB = InlineKeyboardMarkup([[InlineKeyboardButton("🛑 End Session", callback_data="auth:end")]])
+CLOSE_KB = InlineKeyboardMarkup([[InlineKeyboardButton("Close", callback_data="delete")]])
+
+# Static MarkdownV2 texts (already escaped); dynamic texts stay f-strings, which
+# beat str.format, with escape_markdown memoized in utils
+WELCOME_HEADER = "🏠 Welcome to the *iFLY Video Storage Bot*\\!"
+START_MENU_TEXT = WELCOME_HEADER + "\nUse buttons to navigate\\."
+IFLY_HELP_TEXT = "You can send your videos to your bot after completing authentication\\."
+PRIVATE_HELP_TEXT = ("Available commands:\n"
+                     "/start \\- Shows menu\n"
+                     "/help \\- Shows this message\n"
+                     "To upload videos \\- just drop them here\\. Bot will automatically find their correct flight\\.")
+CLEAR_DATA_TEXT = "Data clearing not implemented in this version\\."
+EMPTY_LIBRARY_TEXT = "📦 *Library*\n\nNo videos uploaded yet\\. Send your videos here to get started\\!"
+NO_FLIGHT_VIDEOS_TEXT = "No videos found for this flight\\."
+ASK_USERNAME_TEXT = "To upload videos \\- please send your username"
+SESSION_ENDED_BY_USER_TEXT = "Session ended by user\\. " + ASK_USERNAME_TEXT
+SESSION_START_FAILED_TEXT = "❌ Failed to start session\\. Please try again\\."
+
+# One-letter auth actions used by the private-chat confirmation buttons
+_AUTH_SHORT_ACTIONS = {"c": "confirm", "d": "deny"}
+# Callbacks that may end in an alert; a query can only be answered once, so
+# their handlers answer it themselves instead of callback_handler doing it up front
+_SELF_ANSWERED_CALLBACKS = ("d:c:", "del:confirm:", "end_session")
+
+# BadRequest.message is already normalized by PTB (prefix stripped, capitalized),
+# so these substrings can be matched against it directly
+_NO_TEXT_ERR = "no text in the message"
+_NOT_MODIFIED_ERR = "Message is not modified"
+_CODE_ENTITY_ERR = "code entity"
+
+class OrjsonRequest(HTTPXRequest):
+    """HTTPXRequest that parses Telegram's responses with orjson."""
+
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # Let PTB handle (and report) anything orjson rejects, e.g. invalid UTF-8
+            return HTTPXRequest.parse_json_payload(payload)
+
+
 class iFLYBot:
     """Main bot class."""
     
     def __init__(self):
         self.config = config
         self.db = db
+        # Hot config values bound directly on the bot
+        self.ifly_chat_id = config.ifly_chat_id
+        self.session_length_minutes = config.session_length_minutes
+        # chat_id -> (fetched_at, organized library, rendered pages by day_index),
+        # LRU-ordered; dropped whenever that library changes. The per-chat version
+        # lets a fetch that raced an invalidation know its result is already stale.
+        self._lib_cache: OrderedDict[int, tuple] = OrderedDict()
+        self._lib_version: Dict[int, int] = {}
+        # Fire-and-forget tasks (e.g. deleting user messages); referenced until done
+        self._bg: set = set()
+        self._bg_api_slots = asyncio.Semaphore(BACKGROUND_API_CONCURRENCY)
+        # iFLY chat menu message id; only this process writes it, so the cache is authoritative
+        self._ifly_menu_id: Optional[int] = None
+        # Active upload session, same reasoning: None = no session, loaded on first use
+        # and re-read only after this process creates or ends one
+        self._session: Optional[dict] = None
+        self._session_loaded = False
+        # Bumped on every create/end, so a read that raced one can tell it is stale
+        self._session_version = 0
+        # chat_id -> (message_id, hash of text + markup) of the last screen we rendered;
+        # lets a repeated button press skip an edit Telegram would reject anyway
+        self._last_render: Dict[int, tuple] = {}
+        # chat_id -> lock serializing that chat's edits, so the record above always
+        # describes the edit Telegram applied last (handlers run concurrently)
+        self._render_locks: Dict[int, asyncio.Lock] = {}
+        # target chat_id -> parsed video rows waiting for the next batched insert
+        self._pending_uploads: Dict[int, list] = {}
+        # callback_data prefix -> handler(update, context, rest) for private chats.
+        # Keyboards emit the one-letter forms (callback_data is capped at 64 bytes);
+        # the long ones keep buttons sent before the switch working.
+        self._callbacks = {
+            "auth": self._cb_auth,
+            "a": self._cb_auth,
+            "home": self._cb_home,
+            "stats": self._cb_stats,
+            "nav": self._cb_nav,
+            "n": self._cb_nav,
+            "video": self._cb_video,
+            "v": self._cb_video,
+            "del": self._cb_del,
+            "d": self._cb_del,
+            "delete": self._cb_close,
+            "end_session": self._cb_end_session,
+        }
+        # n:<level> -> handler(update, context, *indices)
+        self._nav_callbacks = {
+            "library": self.navigate_library,
+            "l": self.navigate_library,
+            "day": self.navigate_library,
+            "d": self.navigate_library,
+            "session": self.show_session,
+            "s": self.show_session,
+            "flight": self.show_flight,
+            "f": self.show_flight,
+        }
+    
+    def _spawn(self, coro, limit: bool = True) -> asyncio.Task:
+        """Run a coroutine in the background without blocking the handler.
+
+        Telegram calls are capped at BACKGROUND_API_CONCURRENCY so a burst of
+        deletes can't crowd out the replies users are waiting for; pass
+        limit=False for work that merely waits (e.g. the upload batch timer).
+        """
+        task = asyncio.create_task(self._limited(coro) if limit else coro)
+        self._bg.add(task)
+        task.add_done_callback(self._on_background_done)
+        return task
+    
+    async def _limited(self, coro):
+        try:
+            async with self._bg_api_slots:
+                return await coro
+        finally:
+            coro.close()  # no-op once awaited; avoids a "never awaited" warning if cancelled first
+    
+    async def drain_background(self, application=None):
+        """Let background work finish on shutdown, cancelling whatever outlives the timeout."""
+        if not self._bg:
+            return
+        _, pending = await asyncio.wait(set(self._bg), timeout=SHUTDOWN_DRAIN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    def _on_background_done(self, task: asyncio.Task):
+        self._bg.discard(task)
+        if not task.cancelled() and task.exception():
+            log.error(f"Background task failed: {task.exception()}")
+    
+    async def _db(self, fn, *args, **kwargs):
+        """Run a blocking Database call on a worker thread so the event loop keeps serving updates."""
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    
+    def _get_menu_id(self) -> Optional[int]:
+        """Return the iFLY chat menu message id, loading it from the DB on first use."""
+        if self._ifly_menu_id is None:
+            value = self.db.get_system_value(MENU_MESSAGE_KEY)
+            self._ifly_menu_id = int(value) if value else None
+        return self._ifly_menu_id
+    
+    async def _set_menu_id(self, message_id: int):
+        """Remember a new iFLY chat menu message (persisted for restarts)."""
+        self._ifly_menu_id = message_id
+        await self._db(self.db.set_system_value, MENU_MESSAGE_KEY, str(message_id))
+    
+    async def _active_session(self) -> Optional[dict]:
+        """Return the active session without a DB round trip once it is loaded."""
+        if not self._session_loaded:
+            version = self._session_version
+            session = await self._db(self.db.get_active_session)
+            if self._session_version != version:
+                # A session was created or ended while reading: the result may predate it
+                return await self._active_session()
+            self._session, self._session_loaded = session, True
+        if self._session and self._session['expires_at'] <= time.time():
+            self._session = None
+        return self._session
+    
+    async def _create_session(self, target_chat_id: int, username: str) -> bool:
+        success = await self._db(self.db.create_session, target_chat_id, username, self.session_length_minutes)
+        self._session_version += 1
+        self._session_loaded = False
+        return success
+    
+    async def _end_session(self):
+        await self._db(self.db.end_session)
+        self._session_version += 1
+        self._session, self._session_loaded = None, True
+    
+    async def _edit_if_changed(self, query, text: str, reply_markup: InlineKeyboardMarkup):
+        """Edit the query's message unless it already shows exactly this screen."""
+        message = query.message
+        render = (message.message_id, hash((text, reply_markup)))
+        lock = self._render_locks.get(message.chat_id)
+        if lock is None:
+            lock = self._render_locks[message.chat_id] = asyncio.Lock()
+        async with lock:
+            if self._last_render.get(message.chat_id) == render:
+                return
+            # Forget the old render first: if the edit fails the message content is unknown
+            self._last_render.pop(message.chat_id, None)
+            await query.edit_message_text(text, reply_markup=reply_markup)
+            self._last_render[message.chat_id] = render
+    
+    async def _organized(self, chat_id: int) -> dict:
+        """Return the user's organized library, served from cache when unchanged."""
+        now = time.monotonic()
+        cached = self._lib_cache.get(chat_id)
+        if cached is not None and now - cached[0] < LIBRARY_CACHE_TTL:
+            self._lib_cache.move_to_end(chat_id)
+            return cached[1]
+        version = self._lib_version.get(chat_id, 0)
+        organized = await self._db(self.db.get_organized_videos, chat_id)
+        if self._lib_version.get(chat_id, 0) == version:
+            self._lib_cache[chat_id] = (now, organized, {})
+            self._lib_cache.move_to_end(chat_id)
+            if len(self._lib_cache) > LIBRARY_CACHE_SIZE:
+                self._lib_cache.popitem(last=False)
+        return organized
+    
+    async def _library_page(self, chat_id: int, day_index: Optional[int]) -> tuple:
+        """Return (text, keyboard) for a library page, rendered once per cached library."""
+        organized = await self._organized(chat_id)
+        cached = self._lib_cache.get(chat_id)
+        # Rendered pages live next to the tree they came from, so they share its invalidation
+        pages = cached[2] if cached is not None and cached[1] is organized else {}
+        page = pages.get(day_index)
+        if page is None:
+            if not organized['days']:
+                page = (EMPTY_LIBRARY_TEXT, BACK_HOME_KB)
+            else:
+                page = (generate_tree_text(organized, day_index),
+                        create_navigation_keyboard(organized, day_index))
+            pages[day_index] = page
+        return page
+    
+    def _invalidate_library(self, chat_id: int):
+        """Drop the cached library after the user's videos change."""
+        self._lib_cache.pop(chat_id, None)
+        self._lib_version[chat_id] = self._lib_version.get(chat_id, 0) + 1
     
     # Utility methods
     async def send_closable_message(self, update: Update, text: str):
         """Send a message with a close button."""
-        message = await update.message.reply_text(text, parse_mode='MarkdownV2')
-        reply_markup = InlineKeyboardMarkup([
-            [InlineKeyboardButton("Close", callback_data=f"delete:{update.message.chat_id}:{message.message_id}")]
-        ])
-        return await message.edit_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+        # The Close handler deletes whichever message the button is attached to,
+        # so the markup can go out with the original send
+        return await update.message.reply_text(text, reply_markup=CLOSE_KB)
     
     async def delete_message(self, context: CallbackContext, chat_id: int, message_id: int):
         """Delete a message."""
@@ -48,14 +316,14 @@ class iFLYBot:
     async def start(self, update: Update, context: CallbackContext):
         """Start command handler."""
         try:
-            await update.message.delete()
+            self._spawn(update.message.delete())
             
-            if update.message.chat_id == self.config.ifly_chat_id:
+            if update.message.chat_id == self.ifly_chat_id:
                 # iFLY chat - start authentication process
                 await self.ask_for_username(update, context)
             else:
                 # Private chat - show main menu
-                self.db.add_user(update.message.chat_id, update.message.from_user.username)
+                await self._db(self.db.add_user, update.message.chat_id, update.message.from_user.username)
                 await self.show_start_menu(update, context)
         except Exception as e:
             log.error(f"Error in start command: {e}")
@@ -63,15 +331,12 @@ class iFLYBot:
     async def help(self, update: Update, context: CallbackContext):
         """Help command handler."""
         try:
-            await update.message.delete()
+            self._spawn(update.message.delete())
             
-            if update.message.chat_id == self.config.ifly_chat_id:
-                text = "You can send your videos to your bot after completing authentication\\."
+            if update.message.chat_id == self.ifly_chat_id:
+                text = IFLY_HELP_TEXT
             else:
-                text = ("Available commands:\n"
-                       "/start \\- Shows menu\n"
-                       "/help \\- Shows this message\n"
-                       "To upload videos \\- just drop them here\\. Bot will automatically find their correct flight\\.")
+                text = PRIVATE_HELP_TEXT
             
             await self.send_closable_message(update, text)
         except Exception as e:
@@ -80,10 +345,10 @@ class iFLYBot:
     async def clear_data(self, update: Update, context: CallbackContext):
         """Clear all user data."""
         try:
-            await update.message.delete()
+            self._spawn(update.message.delete())
             # This would require additional database method to clear user videos
             # For now, just show a message
-            await self.send_closable_message(update, "Data clearing not implemented in this version\\.")
+            await self.send_closable_message(update, CLEAR_DATA_TEXT)
         except Exception as e:
             log.error(f"Error in clear_data command: {e}")
     
@@ -91,33 +356,28 @@ class iFLYBot:
     async def show_start_menu(self, update: Update, context: CallbackContext, edit: bool = False):
         """Show the main start menu."""
         try:
-            text = "🏠 Welcome to the *iFLY Video Storage Bot*\\!\nUse buttons to navigate\\."
-            keyboard = [
-                [
-                    InlineKeyboardButton("🎥 Browse Videos", callback_data="nav:library"),
-                    InlineKeyboardButton("📊 My Stats", callback_data="stats")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            text = START_MENU_TEXT
+            reply_markup = START_MENU_KB
             
             if edit and hasattr(update, 'callback_query'):
                 try:
-                    await update.callback_query.edit_message_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
-                except Exception as inner_e:
-                    if "no text in the message" in str(inner_e).lower():
+                    await self._edit_if_changed(update.callback_query, text, reply_markup)
+                except BadRequest as inner_e:
+                    if inner_e.message.startswith(_NOT_MODIFIED_ERR):
+                        pass  # Same screen pressed twice: nothing to update
+                    elif _NO_TEXT_ERR in inner_e.message:
                         # Coming from video message - delete and send new text message
                         chat_id = update.callback_query.from_user.id
-                        await update.callback_query.message.delete()
+                        self._spawn(update.callback_query.message.delete())
                         await context.bot.send_message(
                             chat_id=chat_id,
                             text=text,
-                            parse_mode='MarkdownV2',
                             reply_markup=reply_markup
                         )
                     else:
                         raise
             else:
-                await update.message.reply_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+                await update.message.reply_text(text, reply_markup=reply_markup)
         except Exception as e:
             log.error(f"Error showing start menu: {e}")
 
@@ -125,27 +385,17 @@ class iFLYBot:
         """Show the main start menu with active session info."""
         try:
             remaining = int((expires_time - datetime.now()).total_seconds() // 60)
-            text = (f"🏠 Welcome to the *iFLY Video Storage Bot*\\!\n\n"
+            text = (f"{WELCOME_HEADER}\n\n"
                    f"🟢 *Active Session*\n"
                    f"Videos from iFLY chat will be stored here until "
                    f"{escape_markdown(expires_time.strftime('%H:%M'))} \\(~{remaining} min\\)\\.\n\n"
                    f"Use buttons to navigate\\.")
-            keyboard = [
-                [
-                    InlineKeyboardButton("🎥 Browse Videos", callback_data="nav:library"),
-                    InlineKeyboardButton("📊 My Stats", callback_data="stats")
-                ],
-                [
-                    InlineKeyboardButton("🛑 End Session", callback_data="end_session")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = SESSION_MENU_KB
             
             chat_id = update.callback_query.from_user.id
             await context.bot.send_message(
                 chat_id=chat_id,
                 text=text,
-                parse_mode='MarkdownV2',
                 reply_markup=reply_markup
             )
         except Exception as e:
@@ -155,7 +405,7 @@ class iFLYBot:
         """Show user statistics."""
         try:
             chat_id = update.callback_query.from_user.id
-            stats = self.db.get_user_stats(chat_id)
+            stats = await self._db(self.db.get_user_stats, chat_id)
             
             days_text = format_days_count(stats['days_since_first_flight'])
             time_text = format_flight_time(stats['total_flight_time'])
@@ -164,10 +414,13 @@ class iFLYBot:
                    f"`  `*•*` `🛫 You started flying *{escape_markdown(days_text)} ago*\n"
                    f"`  `*•*` `⏱️ Total tunnel time: *{escape_markdown(time_text)}*")
             
-            keyboard = [[InlineKeyboardButton("← Back", callback_data="home")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = BACK_HOME_KB
             
-            await update.callback_query.edit_message_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+            try:
+                await self._edit_if_changed(update.callback_query, text, reply_markup)
+            except BadRequest as inner_e:
+                if not inner_e.message.startswith(_NOT_MODIFIED_ERR):
+                    raise
         except Exception as e:
             log.error(f"Error showing statistics: {e}")
     
@@ -176,32 +429,25 @@ class iFLYBot:
         """Navigate the video library."""
         try:
             chat_id = update.callback_query.from_user.id
-            organized_data = self.db.get_organized_videos(chat_id)
-            
-            if not organized_data['days']:
-                text = "📦 *Library*\n\nNo videos uploaded yet\\. Send your videos here to get started\\!"
-                keyboard = [[InlineKeyboardButton("← Back", callback_data="home")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-            else:
-                text = generate_tree_text(organized_data, day_index)
-                reply_markup = create_navigation_keyboard(organized_data, day_index)
+            text, reply_markup = await self._library_page(chat_id, day_index)
             
             # Log generated text for debugging markdown issues
             log.debug(f"navigate_library text (len={len(text)}):\n{text}")
             try:
-                await update.callback_query.edit_message_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
-            except Exception as inner_e:
-                if "code entity" in str(inner_e):
+                await self._edit_if_changed(update.callback_query, text, reply_markup)
+            except BadRequest as inner_e:
+                if inner_e.message.startswith(_NOT_MODIFIED_ERR):
+                    pass  # Same screen pressed twice: nothing to update
+                elif _CODE_ENTITY_ERR in inner_e.message:
                     # Fallback: try again without markdown to avoid user-facing error
                     log.warning(f"Markdown parse failed, falling back to plain text: {inner_e}")
-                    await update.callback_query.edit_message_text(text.replace('*', ''), reply_markup=reply_markup)
-                elif "no text in the message" in str(inner_e).lower():
+                    await update.callback_query.edit_message_text(text.replace('*', ''), parse_mode=None, reply_markup=reply_markup)
+                elif _NO_TEXT_ERR in inner_e.message:
                     # Coming from video message - delete and send new text message
-                    await update.callback_query.message.delete()
+                    self._spawn(update.callback_query.message.delete())
                     await context.bot.send_message(
                         chat_id=chat_id,
                         text=text,
-                        parse_mode='MarkdownV2',
                         reply_markup=reply_markup
                     )
                 else:
@@ -213,27 +459,28 @@ class iFLYBot:
         """Show session with flights."""
         try:
             chat_id = update.callback_query.from_user.id
-            organized_data = self.db.get_organized_videos(chat_id)
+            organized_data = await self._organized(chat_id)
             
             day = organized_data['days'][day_index]
-            session = day['sessions'][session_index]
+            session = day.sessions[session_index]
             
-            text = (f"🕐 *Session {escape_markdown(session['time_slot'])}*\n"
-                   f"📅 {escape_markdown(datetime.fromtimestamp(day['date']).strftime('%d.%m.%Y'))}\n\n"
+            text = (f"🕐 *Session {escape_markdown(session.time_slot)}*\n"
+                   f"📅 {escape_markdown(format_date(day.date))}\n\n"
                    f"Select a flight:")
             
-            reply_markup = create_session_view_keyboard(organized_data, day_index, session_index)
+            reply_markup = create_session_view_keyboard(session, day_index, session_index)
             
             try:
-                await update.callback_query.edit_message_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
-            except Exception as inner_e:
-                if "no text in the message" in str(inner_e).lower():
+                await self._edit_if_changed(update.callback_query, text, reply_markup)
+            except BadRequest as inner_e:
+                if inner_e.message.startswith(_NOT_MODIFIED_ERR):
+                    pass  # Same screen pressed twice: nothing to update
+                elif _NO_TEXT_ERR in inner_e.message:
                     # Coming from video message - delete and send new text message
-                    await update.callback_query.message.delete()
+                    self._spawn(update.callback_query.message.delete())
                     await context.bot.send_message(
                         chat_id=chat_id,
                         text=text,
-                        parse_mode='MarkdownV2',
                         reply_markup=reply_markup
                     )
                 else:
@@ -245,31 +492,32 @@ class iFLYBot:
         """Show flight with videos."""
         try:
             chat_id = update.callback_query.from_user.id
-            organized_data = self.db.get_organized_videos(chat_id)
+            organized_data = await self._organized(chat_id)
             
             day = organized_data['days'][day_index]
-            session = day['sessions'][session_index]
-            flight = session['flights'][flight_index]
+            session = day.sessions[session_index]
+            flight = session.flights[flight_index]
             
-            if not flight['videos']:
-                text = "No videos found for this flight\\."
-                keyboard = [[InlineKeyboardButton("← Back", callback_data=f"nav:session:{day_index}:{session_index}")]]
+            if not flight.videos:
+                text = NO_FLIGHT_VIDEOS_TEXT
+                keyboard = [[InlineKeyboardButton("← Back", callback_data=f"n:s:{day_index}:{session_index}")]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
-                await update.callback_query.edit_message_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+                await self._edit_if_changed(update.callback_query, text, reply_markup)
                 return
             
-            video = flight['videos'][video_index]
+            video = flight.videos[video_index]
             
-            reply_markup = create_flight_view_keyboard(organized_data, day_index, session_index, flight_index, video_index)
+            reply_markup = create_flight_view_keyboard(flight, day_index, session_index, flight_index, video_index)
             
-            # Send video
-            await update.callback_query.message.delete()
-            message = await context.bot.send_video(
-                chat_id=chat_id,
-                video=video['file_id'],
-                caption=f"🎬 *Flight {escape_markdown(flight['flight_number'])}* \\- {escape_markdown(video['camera_name'])}",
-                parse_mode='MarkdownV2',
-                reply_markup=reply_markup
+            # Replace the current message with the video (both calls in flight at once)
+            _, message = await asyncio.gather(
+                update.callback_query.message.delete(),
+                context.bot.send_video(
+                    chat_id=chat_id,
+                    video=video.file_id,
+                    caption=f"🎬 *Flight {escape_markdown(flight.flight_number)}* \\- {escape_markdown(video.camera_name)}",
+                    reply_markup=reply_markup
+                )
             )
         except Exception as e:
             log.error(f"Error showing flight: {e}")
@@ -279,118 +527,125 @@ class iFLYBot:
         """Handle video uploads."""
         try:
             # Determine target chat_id
-            if update.message.chat_id == self.config.ifly_chat_id:
+            if update.message.chat_id == self.ifly_chat_id:
                 # iFLY chat - check for active session
-                session = self.db.get_active_session()
+                session = await self._active_session()
                 if not session:
-                    await update.message.delete()
+                    self._spawn(update.message.delete())
                     return
                 target_chat_id = session['target_chat_id']
             else:
                 # Private chat
-                self.db.add_user(update.message.chat_id, update.message.from_user.username)
+                await self._db(self.db.add_user, update.message.chat_id, update.message.from_user.username)
                 target_chat_id = update.message.chat_id
             
             video = update.message.video
             file_id = video.file_id
             file_name = video.file_name
-            duration = round(video.duration / 5) * 5  # Round to nearest 5 seconds
+            duration = (video.duration + 2) // 5 * 5  # Round to nearest 5 seconds (integer math)
             
             # Parse filename
             try:
                 flight_date, time_slot, flight_number, camera_name = parse_filename(file_name)
             except Exception as e:
                 log.error(f"Error parsing filename {file_name}: {e}")
-                await update.message.delete()
+                self._spawn(update.message.delete())
                 return
             
-            # Add video to database
-            success = self.db.add_video(
-                target_chat_id, file_id, file_name, duration,
-                flight_date, time_slot, flight_number, camera_name
-            )
-            
-            if success:
-                log.info(f"Video {file_name} added successfully for user {target_chat_id}")
+            # Queue the video; the first one of a burst schedules the batched insert
+            row = (target_chat_id, file_id, file_name, duration, flight_date, time_slot, flight_number, camera_name)
+            pending = self._pending_uploads.get(target_chat_id)
+            if pending is None:
+                self._pending_uploads[target_chat_id] = [row]
+                self._spawn(self._flush_uploads(target_chat_id), limit=False)
             else:
-                log.info(f"Video {file_name} already exists for user {target_chat_id}")
+                pending.append(row)
             
-            await update.message.delete()
+            self._spawn(update.message.delete())
         except Exception as e:
             log.error(f"Error uploading video: {e}")
     
+    async def _flush_uploads(self, chat_id: int):
+        """Insert every video queued for chat_id within the batch window in one transaction."""
+        await asyncio.sleep(UPLOAD_BATCH_WINDOW)
+        rows = self._pending_uploads.pop(chat_id)
+        inserted = await self._db(self.db.add_videos_bulk, rows)
+        if inserted:
+            self._invalidate_library(chat_id)
+        log.info(f"Stored {inserted} of {len(rows)} videos for user {chat_id} "
+                 f"({len(rows) - inserted} already existed)")
+    
     # iFLY chat authentication
     async def ask_for_username(self, update: Update, context: CallbackContext):
         """Ask for username in iFLY chat."""
         try:
-            session = self.db.get_active_session()
+            session = await self._active_session()
             if session:
                 expires_dt = datetime.fromtimestamp(session['expires_at'])
                 remaining = session['expires_at'] - int(datetime.now().timestamp())
                 mins = max(1, remaining // 60)
                 text = (f"✅ *Session active for @{escape_markdown(session['username'])}*\n\n"
                         f"Expires at {escape_markdown(expires_dt.strftime('%H:%M'))} UTC \\(in {mins} min\\)\\.")
-                reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🛑 End Session", callback_data="auth:end")]])
+                reply_markup = END_SESSION_KB
             else:
-                text = "To upload videos \\- please send your username"
+                text = ASK_USERNAME_TEXT
                 reply_markup = None
             
             # Get or create menu message
-            menu_message_id = self.db.get_system_value("ifly_menu_message_id")
+            menu_message_id = self._get_menu_id()
             if menu_message_id:
                 try:
-                    await context.bot.edit_message_text(text, self.config.ifly_chat_id, int(menu_message_id), parse_mode='MarkdownV2', reply_markup=reply_markup)
+                    await context.bot.edit_message_text(text, self.ifly_chat_id, menu_message_id, reply_markup=reply_markup)
                 except Exception as e:
                     log.error(f"Error editing message: {e}")
                     # Create new message if edit fails
-                    message = await context.bot.send_message(self.config.ifly_chat_id, text, parse_mode='MarkdownV2', reply_markup=reply_markup)
-                    self.db.set_system_value("ifly_menu_message_id", str(message.message_id))
+                    message = await context.bot.send_message(self.ifly_chat_id, text, reply_markup=reply_markup)
+                    await self._set_menu_id(message.message_id)
             else:
-                message = await context.bot.send_message(self.config.ifly_chat_id, text, parse_mode='MarkdownV2', reply_markup=reply_markup)
-                self.db.set_system_value("ifly_menu_message_id", str(message.message_id))
+                message = await context.bot.send_message(self.ifly_chat_id, text, reply_markup=reply_markup)
+                await self._set_menu_id(message.message_id)
         except Exception as e:
             log.error(f"Error asking for username: {e}")
     
     async def check_username(self, update: Update, context: CallbackContext):
         """Check username and start session."""
         try:
-            await update.message.delete()
+            self._spawn(update.message.delete())
             
-            session = self.db.get_active_session()
+            session = await self._active_session()
             if session:
                 return  # Session already active
             
             username = update.message.text.strip()
-            user = self.db.get_user_by_username(username)
+            user = await self._db(self.db.get_user_by_username, username)
             
             if user:
                 # Ask the target user for confirmation in private chat
                 try:
                     confirm_keyboard = InlineKeyboardMarkup([
                         [
-                            InlineKeyboardButton("✅ Allow", callback_data=f"auth:confirm:{user['chat_id']}:{username}"),
-                            InlineKeyboardButton("❌ Deny", callback_data=f"auth:deny:{user['chat_id']}:{username}")
+                            InlineKeyboardButton("✅ Allow", callback_data=f"a:c:{user['chat_id']}:{username}"),
+                            InlineKeyboardButton("❌ Deny", callback_data=f"a:d:{user['chat_id']}:{username}")
                         ]
                     ])
                     await context.bot.send_message(
                         chat_id=user['chat_id'],
                         text=(f"🔐 *Authorization Request*\n" \
                               f"iFLY staff wants to enable uploads from this chat for *@{escape_markdown(username)}*\n" \
-                              f"Allow videos from iFLY chat to be stored in your library for the next {self.config.session_length_minutes} minutes?"),
-                        parse_mode='MarkdownV2',
+                              f"Allow videos from iFLY chat to be stored in your library for the next {self.session_length_minutes} minutes?"),
                         reply_markup=confirm_keyboard
                     )
-                    staff_text = f"Sent authorization request to @{escape_markdown(username)}\. Waiting for user to confirm\."
+                    staff_text = f"Sent authorization request to @{escape_markdown(username)}\\. Waiting for user to confirm\\."
                 except Exception as send_err:
-                    staff_text = f"Failed to send confirmation to user: {escape_markdown(send_err)}"
-                menu_message_id = self.db.get_system_value("ifly_menu_message_id")
+                    staff_text = f"Failed to send confirmation to user: {escape_markdown(str(send_err))}"
+                menu_message_id = self._get_menu_id()
                 if menu_message_id:
-                    await context.bot.edit_message_text(staff_text, self.config.ifly_chat_id, int(menu_message_id), parse_mode='MarkdownV2')
+                    await context.bot.edit_message_text(staff_text, self.ifly_chat_id, menu_message_id)
             else:
                 text = f"User @{escape_markdown(username)} not found\\. Please try again or ask them to start the bot first\\."
-                menu_message_id = self.db.get_system_value("ifly_menu_message_id")
+                menu_message_id = self._get_menu_id()
                 if menu_message_id:
-                    await context.bot.edit_message_text(text, self.config.ifly_chat_id, int(menu_message_id), parse_mode='MarkdownV2')
+                    await context.bot.edit_message_text(text, self.ifly_chat_id, menu_message_id)
         except Exception as e:
             log.error(f"Error checking username: {e}")
     
@@ -403,181 +658,213 @@ class iFLYBot:
                 target_chat_id = int(parts[0])
                 username = parts[1]
                 
-                success = self.db.create_session(target_chat_id, username, self.config.session_length_minutes)
+                success = await self._create_session(target_chat_id, username)
                 if success:
-                    expires_time = datetime.now() + timedelta(minutes=self.config.session_length_minutes)
+                    expires_time = datetime.now() + timedelta(minutes=self.session_length_minutes)
                     text = (f"✅ *Session started for @{escape_markdown(username)}*\n\n"
                            f"You can now send videos\\. Session expires at "
                            f"{escape_markdown(expires_time.strftime('%H:%M'))}\\.")
-                    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🛑 End Session", callback_data="auth:end")]])
+                    reply_markup = END_SESSION_KB
                 else:
-                    text = "❌ Failed to start session\\. Please try again\\."
+                    text = SESSION_START_FAILED_TEXT
                     reply_markup = None
             elif action == "confirm":
                 # User confirmed authorization in private chat
                 parts = data.split(':')
                 target_chat_id = int(parts[0])
                 username = parts[1]
-                success = self.db.create_session(target_chat_id, username, self.config.session_length_minutes)
+                success = await self._create_session(target_chat_id, username)
                 if success:
-                    expires_time = datetime.now() + timedelta(minutes=self.config.session_length_minutes)
+                    expires_time = datetime.now() + timedelta(minutes=self.session_length_minutes)
                     # Notify staff chat
                     staff_text = (f"✅ *Session started for @{escape_markdown(username)}*\n\n"
                                   f"Session expires at {escape_markdown(expires_time.strftime('%H:%M'))} UTC")
-                    menu_message_id = self.db.get_system_value("ifly_menu_message_id")
+                    # The staff notice, removing the confirmation message and the
+                    # user's new home screen are independent: send them together
+                    calls = [
+                        update.callback_query.message.delete(),
+                        self.show_start_menu_with_session(update, context, username, expires_time),
+                    ]
+                    menu_message_id = self._get_menu_id()
                     if menu_message_id:
-                        await context.bot.edit_message_text(
+                        calls.append(context.bot.edit_message_text(
                             staff_text,
-                            self.config.ifly_chat_id,
-                            int(menu_message_id),
-                            parse_mode='MarkdownV2',
-                            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🛑 End Session", callback_data="auth:end")]])
-                        )
-                    # Delete confirmation message to avoid clutter
-                    await update.callback_query.message.delete()
-                    # Show updated home screen with session info
-                    await self.show_start_menu_with_session(update, context, username, expires_time)
+                            self.ifly_chat_id,
+                            menu_message_id,
+                            reply_markup=END_SESSION_KB
+                        ))
+                    await asyncio.gather(*calls)
                 else:
-                    await update.callback_query.edit_message_text("❌ Failed to start session. Try again later.")
+                    await update.callback_query.edit_message_text("❌ Failed to start session. Try again later.", parse_mode=None)
                 return
             elif action == "deny":
                 parts = data.split(':')
                 username = parts[1]
-                # Delete confirmation message to avoid clutter
-                await update.callback_query.message.delete()
-                # Notify staff
-                menu_message_id = self.db.get_system_value("ifly_menu_message_id")
+                # Delete confirmation message to avoid clutter and notify staff at once
+                calls = [update.callback_query.message.delete()]
+                menu_message_id = self._get_menu_id()
                 if menu_message_id:
-                    await context.bot.edit_message_text(f"❌ @{escape_markdown(username)} denied the authorization request.", self.config.ifly_chat_id, int(menu_message_id), parse_mode='MarkdownV2')
+                    calls.append(context.bot.edit_message_text(f"❌ @{escape_markdown(username)} denied the authorization request.", self.ifly_chat_id, menu_message_id))
+                await asyncio.gather(*calls)
                 return
             elif action == "cancel":
                 await self.ask_for_username(update, context)
                 return
             elif action == "end":
-                self.db.end_session()
+                await self._end_session()
                 await self.ask_for_username(update, context)
                 return
             else:
                 return
             
-            menu_message_id = self.db.get_system_value("ifly_menu_message_id")
+            menu_message_id = self._get_menu_id()
             if menu_message_id:
-                await context.bot.edit_message_text(text, self.config.ifly_chat_id, int(menu_message_id),
-                                                  parse_mode='MarkdownV2', reply_markup=reply_markup)
+                await context.bot.edit_message_text(text, self.ifly_chat_id, menu_message_id, reply_markup=reply_markup)
         except Exception as e:
             log.error(f"Error handling auth callback: {e}")
     
-    # Callback query handler
+    # Callback query handlers (dispatched on the callback_data prefix)
+    async def _cb_auth(self, update: Update, context: CallbackContext, rest: str):
+        """auth:<action>[:<data>] - session start/confirm/deny/cancel/end (a:c / a:d for confirm/deny)."""
+        action, _, callback_data = rest.partition(':')
+        action = _AUTH_SHORT_ACTIONS.get(action, action)
+        callback_data = callback_data or None
+        await self.handle_auth_callback(update, context, action, callback_data)
+    
+    async def _cb_home(self, update: Update, context: CallbackContext, rest: str):
+        await self.show_start_menu(update, context, edit=True)
+    
+    async def _cb_stats(self, update: Update, context: CallbackContext, rest: str):
+        await self.show_statistics(update, context)
+    
+    async def _cb_nav(self, update: Update, context: CallbackContext, rest: str):
+        """n:<level>[:indices] - library tree navigation."""
+        level, _, indices = rest.partition(':')
+        handler = self._nav_callbacks.get(level)
+        if handler:
+            await handler(update, context, *(map(int, indices.split(':')) if indices else ()))
+    
+    async def _cb_video(self, update: Update, context: CallbackContext, rest: str):
+        """v:<day>:<session>:<flight>:<video> - switch camera within a flight."""
+        day_index, session_index, flight_index, video_index = map(int, rest.split(':')[:4])
+        await self.show_flight(update, context, day_index, session_index, flight_index, video_index)
+    
+    async def _cb_del(self, update: Update, context: CallbackContext, rest: str):
+        """Deletion workflow: d:a:indices:video_id (ask) or d:c:indices:video_id (confirm)."""
+        sub_action, _, indices = rest.partition(':')
+        try:
+            day_index, session_index, flight_index, video_index, video_id = map(int, indices.split(':')[:5])
+        except ValueError:
+            # Malformed or old-format button; confirm queries are answered here, so
+            # stop the client's spinner before bailing out
+            log.error(f"Invalid delete callback data: {update.callback_query.data!r}")
+            if sub_action in ('c', 'confirm'):
+                await update.callback_query.answer("Delete failed", show_alert=True)
+            return
+        if sub_action in ('a', 'ask'):
+            # show confirmation buttons referencing id
+            keyboard = [
+                [InlineKeyboardButton("✅ Confirm", callback_data=f"d:c:{day_index}:{session_index}:{flight_index}:{video_index}:{video_id}")],
+                [InlineKeyboardButton("↩️ Cancel", callback_data=f"v:{day_index}:{session_index}:{flight_index}:{video_index}")]
+            ]
+            try:
+                await update.callback_query.edit_message_caption(
+                    caption=update.callback_query.message.caption + "\n\n⚠️ Delete this video?",
+                    parse_mode=None,
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+            except Exception:
+                pass
+        elif sub_action in ('c', 'confirm'):
+            deleted = await self._db(self.db.delete_video_by_id, update.callback_query.from_user.id, video_id)
+            if deleted:
+                await update.callback_query.answer()
+                self._invalidate_library(update.callback_query.from_user.id)
+                # After deletion, show flight again (video_index clamp)
+                organized = await self._organized(update.callback_query.from_user.id)
+                try:
+                    flight_videos = organized['days'][day_index].sessions[session_index].flights[flight_index].videos
+                    new_index = min(video_index, len(flight_videos)-1) if flight_videos else 0
+                    if flight_videos:
+                        await self.show_flight(update, context, day_index, session_index, flight_index, new_index)
+                    else:
+                        # If no videos left in flight, go back to session view
+                        await self.show_session(update, context, day_index, session_index)
+                except Exception:
+                    await self.navigate_library(update, context)
+            else:
+                await update.callback_query.answer("Delete failed", show_alert=True)
+    
+    async def _cb_close(self, update: Update, context: CallbackContext, rest: str):
+        """Close button: remove the message it is attached to."""
+        query = update.callback_query
+        await self.delete_message(context, query.message.chat_id, query.message.message_id)
+    
+    async def _cb_end_session(self, update: Update, context: CallbackContext, rest: str):
+        """User ending session from their private chat."""
+        user_chat_id = update.callback_query.from_user.id
+        session = await self._active_session()
+        if session and session['target_chat_id'] == user_chat_id:
+            await update.callback_query.answer()
+            await self._end_session()
+            # Notify staff chat
+            menu_message_id = self._get_menu_id()
+            if menu_message_id:
+                try:
+                    await context.bot.edit_message_text(
+                        SESSION_ENDED_BY_USER_TEXT,
+                        self.ifly_chat_id,
+                        menu_message_id
+                    )
+                except Exception:
+                    pass
+            # Show normal home screen
+            await self.show_start_menu(update, context, edit=True)
+        else:
+            await update.callback_query.answer("No active session found", show_alert=True)
+    
     async def callback_handler(self, update: Update, context: CallbackContext):
         """Handle all callback queries."""
         try:
             query = update.callback_query
-            await query.answer()
+            if not query.data.startswith(_SELF_ANSWERED_CALLBACKS):
+                await query.answer()
             
-            data = query.data
-            parts = data.split(':')
+            # partition splits off the head in one call; handlers split the
+            # tail themselves only when they take arguments
+            kind, _, rest = query.data.partition(':')
             
-            if update.callback_query.message.chat_id == self.config.ifly_chat_id:
+            if query.message.chat_id == self.ifly_chat_id:
                 # iFLY chat callbacks
-                if parts[0] == "auth":
-                    action = parts[1]
-                    callback_data = ':'.join(parts[2:]) if len(parts) > 2 else None
-                    await self.handle_auth_callback(update, context, action, callback_data)
+                if kind == "auth":
+                    await self._cb_auth(update, context, rest)
             else:
                 # Private chat callbacks
-                if parts[0] == "auth":
-                    # user confirming or denying
-                    action = parts[1]
-                    callback_data = ':'.join(parts[2:]) if len(parts) > 2 else None
-                    await self.handle_auth_callback(update, context, action, callback_data)
-                    return
-                if parts[0] == "home":
-                    await self.show_start_menu(update, context, edit=True)
-                elif parts[0] == "stats":
-                    await self.show_statistics(update, context)
-                elif parts[0] == "nav":
-                    if parts[1] == "library":
-                        await self.navigate_library(update, context)
-                    elif parts[1] == "day":
-                        day_index = int(parts[2])
-                        await self.navigate_library(update, context, day_index)
-                    elif parts[1] == "session":
-                        day_index, session_index = int(parts[2]), int(parts[3])
-                        await self.show_session(update, context, day_index, session_index)
-                    elif parts[1] == "flight":
-                        day_index, session_index, flight_index = int(parts[2]), int(parts[3]), int(parts[4])
-                        await self.show_flight(update, context, day_index, session_index, flight_index)
-                elif parts[0] == "video":
-                    day_index, session_index, flight_index, video_index = map(int, parts[1:5])
-                    await self.show_flight(update, context, day_index, session_index, flight_index, video_index)
-                elif parts[0] == "del":
-                    # deletion workflow: del:ask:indices or del:confirm:indices:file_id
-                    sub_action = parts[1]
-                    if sub_action == 'ask':
-                        day_index, session_index, flight_index, video_index, video_id = map(int, parts[2:7])
-                        # show confirmation buttons referencing id
-                        keyboard = [
-                            [InlineKeyboardButton("✅ Confirm", callback_data=f"del:confirm:{day_index}:{session_index}:{flight_index}:{video_index}:{video_id}")],
-                            [InlineKeyboardButton("↩️ Cancel", callback_data=f"video:{day_index}:{session_index}:{flight_index}:{video_index}")]
-                        ]
-                        try:
-                            await update.callback_query.edit_message_caption(
-                                caption=update.callback_query.message.caption + "\n\n⚠️ Delete this video?",
-                                reply_markup=InlineKeyboardMarkup(keyboard)
-                            )
-                        except Exception:
-                            pass
-                    elif sub_action == 'confirm':
-                        day_index, session_index, flight_index, video_index, video_id = map(int, parts[2:7])
-                        deleted = self.db.delete_video_by_id(update.callback_query.from_user.id, video_id)
-                        if deleted:
-                            # After deletion, show flight again (video_index clamp)
-                            organized = self.db.get_organized_videos(update.callback_query.from_user.id)
-                            try:
-                                flight_videos = organized['days'][day_index]['sessions'][session_index]['flights'][flight_index]['videos']
-                                new_index = min(video_index, len(flight_videos)-1) if flight_videos else 0
-                                if flight_videos:
-                                    await self.show_flight(update, context, day_index, session_index, flight_index, new_index)
-                                else:
-                                    # If no videos left in flight, go back to session view
-                                    await self.show_session(update, context, day_index, session_index)
-                            except Exception:
-                                await self.navigate_library(update, context)
-                        else:
-                            await update.callback_query.answer("Delete failed", show_alert=True)
-                elif parts[0] == "delete":
-                    chat_id, message_id = int(parts[1]), int(parts[2])
-                    await self.delete_message(context, chat_id, message_id)
-                elif parts[0] == "end_session":
-                    # User ending session from their private chat
-                    user_chat_id = update.callback_query.from_user.id
-                    session = self.db.get_active_session()
-                    if session and session['target_chat_id'] == user_chat_id:
-                        self.db.end_session()
-                        # Notify staff chat
-                        menu_message_id = self.db.get_system_value("ifly_menu_message_id")
-                        if menu_message_id:
-                            try:
-                                await context.bot.edit_message_text(
-                                    "Session ended by user\\. To upload videos \\- please send your username",
-                                    self.config.ifly_chat_id,
-                                    int(menu_message_id),
-                                    parse_mode='MarkdownV2'
-                                )
-                            except Exception:
-                                pass
-                        # Show normal home screen
-                        await self.show_start_menu(update, context, edit=True)
-                    else:
-                        await update.callback_query.answer("No active session found", show_alert=True)
+                handler = self._callbacks.get(kind)
+                if handler:
+                    await handler(update, context, rest)
         except Exception as e:
             log.error(f"Error handling callback: {e}")
 
 def main():
     """Main function to start the bot."""
+    if uvloop is not None:
+        # Must happen before PTB creates the event loop in run_polling/run_webhook
+        uvloop.install()
     bot = iFLYBot()
     
-    application = ApplicationBuilder().token(config.bot_token).build()
+    # Handlers run as independent tasks so one slow update doesn't hold up the
+    # rest; every message the bot sends is MarkdownV2 unless it says otherwise
+    defaults = Defaults(parse_mode='MarkdownV2', block=False)
+    # post_stop runs while the bot can still make API calls, unlike post_shutdown.
+    # concurrent_updates lets the dispatcher run handler selection for several
+    # updates at once, so one chat's burst never queues behind another's
+    builder = (ApplicationBuilder().token(config.bot_token).defaults(defaults)
+               .concurrent_updates(True).post_stop(bot.drain_background))
+    if orjson is not None:
+        # Same pool sizes ApplicationBuilder uses for its own default requests
+        builder = builder.request(OrjsonRequest(connection_pool_size=256)).get_updates_request(OrjsonRequest())
+    application = builder.build()
     
     # Command handlers
     application.add_handler(CommandHandler("start", bot.start))
@@ -592,7 +879,20 @@ def main():
     application.add_handler(CallbackQueryHandler(bot.callback_handler))
     
     print("iFLY Videos Bot Online")
-    application.run_polling()
+    if config.use_webhook:
+        # Telegram pushes updates to us: no idle getUpdates traffic at all.
+        # The token as URL path keeps the endpoint unguessable
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=config.webhook_port,
+            url_path=config.bot_token,
+            webhook_url=f"{config.webhook_url}/{config.bot_token}",
+            secret_token=config.webhook_secret,
+            bootstrap_retries=-1,
+        )
+    else:
+        # Retry the initial connection indefinitely instead of exiting on a network blip
+        application.run_polling(timeout=POLLING_TIMEOUT, poll_interval=0.0, bootstrap_retries=-1)
 
 if __name__ == "__main__":
     main()
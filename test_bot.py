@@ -1,144 +1,243 @@
 #!/usr/bin/env python3
 """
-Test script for iFLY Videos Bot
-This script verifies that all components work correctly.
+Tests for iFLY Videos Bot
+Run with `pytest` (add `-n auto` when pytest-xdist is installed), or `python test_bot.py`.
 """
 
+import asyncio
+import sqlite3
 import sys
-import os
-from pathlib import Path
+import threading
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
 
-def test_imports():
-    """Test that all required modules can be imported."""
-    print("Testing imports...")
-    try:
-        import sqlite3  # noqa: F401
-        from datetime import datetime  # noqa: F401
-        print("✅ Standard library imports work")
-    except ImportError as e:
-        print(f"❌ Standard library import failed: {e}")
-        return False
+import pytest
 
+from config import Config
+from database import Database
+from utils import parse_filename, format_flight_time, format_days_count
+
+CHAT_ID = 12345
+DAY = 1724256000
+
+
+@pytest.fixture(scope="session")
+def config(tmp_path_factory):
+    """Config loaded once from a test environment, restored afterwards."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("TELEGRAM_BOT_TOKEN", "test_token")
+        mp.setenv("TELEGRAM_IFLY_CHAT_ID", "123456789")
+        mp.setenv("DATABASE_PATH", str(tmp_path_factory.mktemp("config") / "test.db"))
+        mp.setenv("SESSION_LENGTH_MINUTES", "30")
+        mp.setenv("LOG_LEVEL", "INFO")
+        yield Config()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Fresh database holding one user and one video."""
+    database = Database(str(tmp_path / "test_videos.db"))
+    assert database.add_user(CHAT_ID, "testuser"), "Failed to add user"
+    assert database.add_video(CHAT_ID, "test_file_id", "ifly_Door_F001_2025_08_21_14_30_001.mp4",
+                              60, DAY, "14:30", "F001", "Door"), "Failed to add video"
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def bulk_db(db):
+    """Database after a bulk insert of two new videos and one duplicate."""
+    rows = [
+        (CHAT_ID, "bulk_file_1", "ifly_Door_F002_2025_08_21_14_30_001.mp4", 60, DAY, "14:30", "F002", "Door"),
+        (CHAT_ID, "bulk_file_2", "ifly_Sideline_F002_2025_08_21_14_30_001.mp4", 60, DAY, "14:30", "F002", "Sideline"),
+        (CHAT_ID, "test_file_id", "ifly_Door_F001_2025_08_21_14_30_001.mp4", 60, DAY, "14:30", "F001", "Door"),
+    ]
+    assert db.add_videos_bulk(rows) == 2, "Bulk insert count mismatch"
+    return db
+
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    """The bot module, imported once under a test environment (it reads config at import)."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("TELEGRAM_BOT_TOKEN", "123:abc")
+        mp.setenv("TELEGRAM_IFLY_CHAT_ID", "-100")
+        mp.setenv("DATABASE_PATH", str(tmp_path_factory.mktemp("main") / "videos.db"))
+        import main
+    return main
+
+
+@pytest.fixture
+def bot(main_module, db):
+    """Bot instance backed by the per-test database."""
+    instance = main_module.iFLYBot()
+    instance.db = db
+    return instance
+
+
+def test_config(config):
+    assert config.bot_token == "test_token"
+    assert config.ifly_chat_id == 123456789
+    assert config.session_length_minutes == 30
+    assert config.database_path.endswith("test.db")
+
+
+def test_user_roundtrip(db):
+    user = db.get_user_by_chat_id(CHAT_ID)
+    assert user is not None, "Failed to retrieve user"
+    assert user['username'] == "testuser"
+
+
+def test_add_user_takes_over_username(db):
+    # Same name (different case) from a new account: the stale account releases it
+    assert db.add_user(CHAT_ID + 1, "TestUser"), "Username takeover failed"
+    assert db.get_user_by_chat_id(CHAT_ID)['username'] is None, "Old account kept the username"
+    assert db.get_user_by_username("testuser")['chat_id'] == CHAT_ID + 1
+
+
+def test_add_video(db):
+    assert len(db.get_videos_by_user(CHAT_ID)) == 1, "Failed to retrieve videos"
+
+
+def test_bulk_insert_skips_duplicates(bulk_db):
+    assert len(bulk_db.get_videos_by_user(CHAT_ID)) == 3, "Bulk insert failed"
+    assert bulk_db.get_user_stats(CHAT_ID)['total_flight_time'] == 180, "User stats out of sync"
+
+
+def test_stats_after_deleting_every_video(db):
+    video_id = db.get_videos_by_user(CHAT_ID)[0]['id']
+    assert db.delete_video_by_id(CHAT_ID, video_id), "Failed to delete video"
+    assert db.add_video(CHAT_ID, "new_file_id", "ifly_Door_F002_2025_08_22_14_30_001.mp4",
+                        60, DAY + 86400, "14:30", "F002", "Door"), "Failed to re-add video"
+    stats = db.get_user_stats(CHAT_ID)
+    assert stats['total_flight_time'] == 60, "User stats out of sync"
+    assert stats['days_since_first_flight'] > 0, "First flight lost after deleting every video"
+
+
+def test_username_nocase_migration_keeps_every_user(tmp_path):
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(path)
+    legacy.executescript("""
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO users (chat_id, username) VALUES (1, 'Bob'), (2, 'bob'), (3, NULL), (4, 'alice');
+    """)
+    legacy.close()
+
+    database = Database(str(path))
     try:
-        from config import Config
-        from database import Database
-        from utils import parse_filename, format_flight_time
-        print("✅ Local module imports work")
-    except ImportError as e:
-        print(f"❌ Local module import failed: {e}")
-        return False
-    
-    return True
-
-def test_config():
-    """Test environment configuration loading."""
-    print("\nTesting configuration...")
-    try:
-        # Set env vars
-        os.environ["TELEGRAM_BOT_TOKEN"] = "test_token"
-        os.environ["TELEGRAM_IFLY_CHAT_ID"] = "123456789"
-        os.environ["DATABASE_PATH"] = "./data/test.db"
-        os.environ["SESSION_LENGTH_MINUTES"] = "30"
-        os.environ["LOG_LEVEL"] = "INFO"
-
-        from config import Config
-        config = Config()
-
-        assert config.bot_token == "test_token"
-        assert config.ifly_chat_id == 123456789
-        assert config.session_length_minutes == 30
-        assert config.database_path.endswith("test.db")
-
-        print("✅ Configuration loading works")
-        return True
-    except Exception as e:
-        print(f"❌ Configuration test failed: {e}")
-        return False
-
-def test_database():
-    """Test database operations."""
-    print("\nTesting database...")
-    try:
-        from database import Database
-        
-        # Create test database
-        db = Database("./data/test_videos.db")
-        
-        # Test user operations
-        success = db.add_user(12345, "testuser")
-        assert success, "Failed to add user"
-        
-        user = db.get_user_by_chat_id(12345)
-        assert user is not None, "Failed to retrieve user"
-        assert user['username'] == "testuser"
-        
-        # Test video operations
-        success = db.add_video(12345, "test_file_id", "ifly_Door_F001_2025_08_21_14_30_001.mp4", 
-                              60, 1724256000, "14:30", "F001", "Door")
-        assert success, "Failed to add video"
-        
-        videos = db.get_videos_by_user(12345)
-        assert len(videos) == 1, "Failed to retrieve videos"
-        
-        # Cleanup
-        Path("./data/test_videos.db").unlink(missing_ok=True)
-        
-        print("✅ Database operations work")
-        return True
-    except Exception as e:
-        print(f"❌ Database test failed: {e}")
-        return False
-
-def test_utils():
-    """Test utility functions."""
-    print("\nTesting utilities...")
-    try:
-        from utils import parse_filename, format_flight_time, format_days_count
-
-        # Test filename parsing
-        fname = "ifly_Door_F001_2025_08_21_14_30_001.mp4"
-        date, time_slot, flight_number, camera_name = parse_filename(fname)
-        print('Parsed filename ->', date, time_slot, flight_number, camera_name)
-        assert camera_name == "Door", f"camera_name mismatch: {camera_name}"
-        assert flight_number == "F001", f"flight_number mismatch: {flight_number}"
-        assert time_slot == "14:30", f"time_slot mismatch: {time_slot}"
-
-        # Test time formatting
-        formatted = format_flight_time(3661)  # 1 hour, 1 minute, 1 second
-        print('Formatted flight time ->', formatted)
-        assert "1h" in formatted, f"formatted time missing hour: {formatted}"
-
-        # Test days formatting
-        days_text = format_days_count(45)
-        print('Formatted days count ->', days_text)
-        assert any(k in days_text.lower() for k in ("day", "month", "year")), f"unexpected days text: {days_text}"
-
-        print("✅ Utility functions work")
-        return True
-    except Exception as e:
-        print(f"❌ Utility test failed: {e}")
-        return False
-
-def main():
-    """Run all tests."""
-    print("🧪 Running iFLY Videos Bot Tests")
-    print("=" * 40)
-    
-    tests = [test_imports, test_config, test_database, test_utils]
-    passed = 0
-    
-    for test in tests:
-        if test():
-            passed += 1
-    
-    print(f"\n📊 Results: {passed}/{len(tests)} tests passed")
-    
-    if passed == len(tests):
-        print("🎉 All tests passed! The bot should work correctly.")
-        return 0
+        users = {row[0]: row[1] for row in database.get_connection().execute("SELECT chat_id, username FROM users")}
+    finally:
+        database.close()
+    # The newest 'bob' keeps the name, the older one releases it
+    assert users == {1: None, 2: "bob", 3: None, 4: "alice"}, "Migration lost or mangled users"
+
+
+def test_library_grouping(bulk_db):
+    # day -> session -> flight, cameras in rank order
+    flights = bulk_db.get_organized_videos(CHAT_ID)['days'][0].sessions[0].flights
+    assert [f.flight_number for f in flights] == ["F001", "F002"], "Flight grouping mismatch"
+    assert [v.camera_name for v in flights[1].videos] == ["Door", "Sideline"], "Camera order mismatch"
+
+
+@pytest.mark.parametrize("fname, expected", [
+    # Pattern A (legacy)
+    ("ifly_Door_F001_2025_08_21_14_30_001.mp4", ((2025, 8, 21), "14:30", "F001", "Door")),
+    # Pattern B (long form, numeric flight padded)
+    ("iFlyMinsk_iFLYPROEvents_Door_10_2025-08-17_21-30-33.mp4", ((2025, 8, 17), "21:30", "F010", "Door")),
+    # Generic fallback
+    ("iFlyMinsk_Sideline_F003_2025-08-17_09-45-12.mp4", ((2025, 8, 17), "09:30", "F003", "Sideline")),
+    ("Door_7_2025_08_21_14_05_1.mp4", ((2025, 8, 21), "14:00", "F007", "Door")),
+])
+def test_parse_filename(fname, expected):
+    (year, month, day), time_slot, flight_number, camera_name = expected
+    assert parse_filename(fname) == (int(datetime(year, month, day).timestamp()), time_slot, flight_number, camera_name)
+
+
+@pytest.mark.parametrize("fname", ["no_date_here.mp4", "ifly_Door_F001_2025_13_21_14_30_001.mp4"])
+def test_parse_filename_rejects(fname):
+    with pytest.raises(ValueError):
+        parse_filename(fname)
+
+
+def test_format_flight_time():
+    assert "1h" in format_flight_time(3661)  # 1 hour, 1 minute, 1 second
+
+
+def test_format_days_count():
+    days_text = format_days_count(45)
+    assert any(k in days_text.lower() for k in ("day", "month", "year")), f"unexpected days text: {days_text}"
+
+
+def test_overlapping_edits_keep_latest_render(bot):
+    applied = []
+
+    def query(delay):
+        q = MagicMock()
+        q.message.chat_id, q.message.message_id = CHAT_ID, 1
+
+        async def edit_message_text(text, reply_markup=None):
+            await asyncio.sleep(delay)
+            applied.append(text)
+        q.edit_message_text = edit_message_text
+        return q
+
+    async def scenario():
+        # The first edit is slower, so unserialized it would finish last
+        await asyncio.gather(bot._edit_if_changed(query(0.05), "A", None),
+                             bot._edit_if_changed(query(0), "B", None))
+    asyncio.run(scenario())
+    assert applied == ["A", "B"], "Edits for one chat overlapped"
+    assert bot._last_render[CHAT_ID] == (1, hash(("B", None))), "Render record is not the last edit"
+
+
+@pytest.mark.parametrize("write", ["create", "end"])
+def test_session_read_racing_a_write_is_not_cached(bot, write):
+    real_read = bot.db.get_active_session
+    started, committed = threading.Event(), threading.Event()
+
+    def stale_read():
+        # Snapshot the state before the write commits, return it after
+        snapshot = real_read()
+        started.set()
+        committed.wait(5)
+        return snapshot
+
+    async def scenario():
+        if write == "end":
+            assert await bot._create_session(CHAT_ID, "testuser")
+        bot._session_loaded = False
+        bot.db.get_active_session = stale_read
+        read = asyncio.create_task(bot._active_session())
+        await asyncio.to_thread(started.wait, 5)
+        if write == "create":
+            assert await bot._create_session(CHAT_ID, "testuser")
+        else:
+            await bot._end_session()
+        committed.set()
+        return await read, await bot._active_session()
+
+    raced, current = asyncio.run(scenario())
+    if write == "create":
+        assert raced is not None and current is not None, "New session overwritten by a stale read"
+        assert current['target_chat_id'] == CHAT_ID
     else:
-        print("❌ Some tests failed. Please check the errors above.")
-        return 1
+        assert raced is None and current is None, "Ended session restored by a stale read"
+
+
+@pytest.mark.parametrize("data", ["d:c:1:0", "d:c:x:0:0:0:1", "del:confirm:"])
+def test_malformed_delete_confirm_is_answered(bot, data):
+    query = MagicMock()
+    query.data, query.message.chat_id, query.from_user.id = data, CHAT_ID, CHAT_ID
+    query.answer = AsyncMock()
+    update = MagicMock(callback_query=query)
+    asyncio.run(bot.callback_handler(update, MagicMock()))
+    query.answer.assert_awaited_once()
+
 
 if __name__ == "__main__":
-    sys.exit(main())
+    sys.exit(pytest.main([__file__, "-q"]))
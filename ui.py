@@ -1,38 +1,42 @@
-from datetime import datetime
+from functools import lru_cache
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from utils import format_date, escape_markdown
+from database import Session, Flight
 import logging
 
 log = logging.getLogger(__name__)
 
-def generate_tree_text(organized_data: dict, day_index: int = None, session_index: int = None) -> str:
+# Tree glyphs and plural suffixes, indexed by a bool (is-last / count == 1)
+_BRANCH = ("├── ", "└── ")
+_VBAR = ("│   ", "    ")
+_PLURAL = ("s", "")
+
+def generate_tree_text(organized_data: dict, day_index: int = None) -> str:
     """Generate the tree view text for video library."""
     try:
         tree_text = ["━━━━━━━━━━━━━━━━", "📦 *Library*"]
 
         days = organized_data.get('days', [])
         for day_idx, day in enumerate(days):
-            line_parts = []
             # Branch/leaf symbol
-            line_parts.append("└── " if day_idx + 1 == len(days) else "├── ")
+            is_last_day = day_idx + 1 == len(days)
+            branch = _BRANCH[is_last_day]
             # Folder icon and optional bold
             if day_index == day_idx:
-                line_parts.append("📂 *" + escape_markdown(format_date(day['date'])) + "*")
+                tree_text.append(f"{branch}📂 *{escape_markdown(format_date(day.date))}*")
             else:
-                line_parts.append("📁 " + escape_markdown(format_date(day['date'])))
-            tree_text.append(''.join(line_parts))
+                tree_text.append(f"{branch}📁 {escape_markdown(format_date(day.date))}")
 
             if day_index == day_idx:
-                sessions = day.get('sessions', [])
+                sessions = day.sessions
+                # Vertical connector spacing
+                indent = _VBAR[is_last_day]
                 for sess_idx, session in enumerate(sessions):
-                    sess_line = []
-                    # Vertical connector spacing
-                    sess_line.append("    " if day_idx + 1 == len(days) else "│   ")
                     # Branch/leaf for session
-                    sess_line.append("└── " if sess_idx + 1 == len(sessions) else "├── ")
-                    flights_count = len(session.get('flights', []))
-                    sess_line.append(f"🕐 {escape_markdown(session['time_slot'])} \\({flights_count} flight{'s' if flights_count != 1 else ''}\\)")
-                    tree_text.append(''.join(sess_line))
+                    sess_branch = _BRANCH[sess_idx + 1 == len(sessions)]
+                    flights_count = len(session.flights)
+                    tree_text.append(f"{indent}{sess_branch}🕐 {escape_markdown(session.time_slot)} "
+                                     f"\\({flights_count} flight{_PLURAL[flights_count == 1]}\\)")
 
         tree_text.append("━━━━━━━━━━━━━━━━")
         return "\n".join(tree_text)
@@ -40,104 +44,85 @@ def generate_tree_text(organized_data: dict, day_index: int = None, session_inde
         log.error(f"Error generating tree text: {e}")
         return "Error generating library view"
 
-def create_navigation_keyboard(organized_data: dict, day_index: int = None, session_index: int = None) -> InlineKeyboardMarkup:
+def create_navigation_keyboard(organized_data: dict, day_index: int = None) -> InlineKeyboardMarkup:
     """Create navigation keyboard for the tree view."""
-    keyboard = []
-    
+    # Markups are immutable, so equal layouts share one cached instance across users
     if day_index is None:
         # Main library view - show day buttons
         days = organized_data.get('days', [])
-        for day_idx, day in enumerate(days):
-            date_str = format_date(day['date'])
-            sessions_count = len(day.get('sessions', []))
-            button_text = f"📁 {date_str} ({sessions_count} sessions)"
-            keyboard.append([
-                InlineKeyboardButton(button_text, callback_data=f"nav:day:{day_idx}")
-            ])
-        
-        keyboard.append([
-            InlineKeyboardButton("← Back", callback_data="home")
-        ])
-    else:
-        # Day view - show sessions
-        day = organized_data['days'][day_index]
-        sessions = day.get('sessions', [])
-        
-        # Session buttons (max 2 per row)
-        session_buttons = []
-        for sess_idx, session in enumerate(sessions):
-            flights_count = len(session.get('flights', []))
-            button_text = f"{session['time_slot']} ({flights_count})"
-            session_buttons.append(
-                InlineKeyboardButton(button_text, callback_data=f"nav:session:{day_index}:{sess_idx}")
-            )
-        
-        # Arrange session buttons in rows of 2
-        for i in range(0, len(session_buttons), 2):
-            row = session_buttons[i:i+2]
-            keyboard.append(row)
-        
-        # Navigation buttons
+        return _days_keyboard(tuple((format_date(day.date), len(day.sessions)) for day in days))
+    # Day view - show sessions
+    day = organized_data['days'][day_index]
+    return _sessions_keyboard(day_index, tuple((session.time_slot, len(session.flights)) for session in day.sessions))
+
+@lru_cache(maxsize=256)
+def _days_keyboard(days_key: tuple) -> InlineKeyboardMarkup:
+    """Build the day list keyboard from (date_str, sessions_count) pairs."""
+    keyboard = []
+    for day_idx, (date_str, sessions_count) in enumerate(days_key):
+        button_text = f"📁 {date_str} ({sessions_count} sessions)"
         keyboard.append([
-            InlineKeyboardButton("← Back", callback_data="nav:library"),
-            InlineKeyboardButton("🏠 Home", callback_data="home")
+            InlineKeyboardButton(button_text, callback_data=f"n:d:{day_idx}")
         ])
     
+    keyboard.append([
+        InlineKeyboardButton("← Back", callback_data="home")
+    ])
     return InlineKeyboardMarkup(keyboard)
 
-def create_session_view_keyboard(organized_data: dict, day_index: int, session_index: int) -> InlineKeyboardMarkup:
-    """Create keyboard for session view showing flights."""
-    keyboard = []
+@lru_cache(maxsize=256)
+def _sessions_keyboard(day_index: int, sessions_key: tuple) -> InlineKeyboardMarkup:
+    """Build a day's session keyboard from (time_slot, flights_count) pairs."""
+    # Session buttons (max 2 per row)
+    session_buttons = [
+        InlineKeyboardButton(f"{time_slot} ({flights_count})", callback_data=f"n:s:{day_index}:{sess_idx}")
+        for sess_idx, (time_slot, flights_count) in enumerate(sessions_key)
+    ]
     
-    day = organized_data['days'][day_index]
-    session = day['sessions'][session_index]
-    flights = session.get('flights', [])
+    # Arrange session buttons in rows of 2
+    keyboard = [session_buttons[i:i + 2] for i in range(0, len(session_buttons), 2)]
     
-    # Flight buttons
-    for flight_idx, flight in enumerate(flights):
-        videos_count = len(flight.get('videos', []))
-        button_text = f"Flight {flight['flight_number']} ({videos_count} videos)"
-        keyboard.append([
-            InlineKeyboardButton(button_text, callback_data=f"nav:flight:{day_index}:{session_index}:{flight_idx}")
-        ])
+    # Navigation buttons
+    keyboard.append([
+        InlineKeyboardButton("← Back", callback_data="n:l"),
+        InlineKeyboardButton("🏠 Home", callback_data="home")
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+def create_session_view_keyboard(session: Session, day_index: int, session_index: int) -> InlineKeyboardMarkup:
+    """Create keyboard for session view showing flights (indices only feed callback_data)."""
+    # Flight buttons, one per row
+    keyboard = [
+        [InlineKeyboardButton(f"Flight {flight.flight_number} ({len(flight.videos)} videos)",
+                              callback_data=f"n:f:{day_index}:{session_index}:{flight_idx}")]
+        for flight_idx, flight in enumerate(session.flights)
+    ]
     
     # Navigation buttons
     keyboard.append([
-        InlineKeyboardButton("← Back", callback_data=f"nav:day:{day_index}"),
+        InlineKeyboardButton("← Back", callback_data=f"n:d:{day_index}"),
         InlineKeyboardButton("🏠 Home", callback_data="home")
     ])
     
     return InlineKeyboardMarkup(keyboard)
 
-def create_flight_view_keyboard(organized_data: dict, day_index: int, session_index: int, flight_index: int, current_video: int = 0) -> InlineKeyboardMarkup:
-    """Create keyboard for flight view showing videos."""
-    keyboard = []
-    
-    day = organized_data['days'][day_index]
-    session = day['sessions'][session_index]
-    flight = session['flights'][flight_index]
-    videos = flight.get('videos', [])
+def create_flight_view_keyboard(flight: Flight, day_index: int, session_index: int, flight_index: int, current_video: int = 0) -> InlineKeyboardMarkup:
+    """Create keyboard for flight view showing videos (indices only feed callback_data)."""
+    videos = flight.videos
     
-    # Video selection buttons
-    video_buttons = []
-    for video_idx, video in enumerate(videos):
-        if video_idx == current_video:
-            button_text = f"● {video['camera_name']}"
-        else:
-            button_text = video['camera_name']
-        
-        video_buttons.append(
-            InlineKeyboardButton(button_text, callback_data=f"video:{day_index}:{session_index}:{flight_index}:{video_idx}")
-        )
+    # Video selection buttons, the current one marked
+    video_buttons = [
+        InlineKeyboardButton(f"● {video.camera_name}" if video_idx == current_video else video.camera_name,
+                             callback_data=f"v:{day_index}:{session_index}:{flight_index}:{video_idx}")
+        for video_idx, video in enumerate(videos)
+    ]
     
     # Arrange video buttons in rows of 2
-    for i in range(0, len(video_buttons), 2):
-        row = video_buttons[i:i+2]
-        keyboard.append(row)
+    keyboard = [video_buttons[i:i + 2] for i in range(0, len(video_buttons), 2)]
     
     # Navigation buttons
     keyboard.append([
-        InlineKeyboardButton("← Back", callback_data=f"nav:session:{day_index}:{session_index}"),
+        InlineKeyboardButton("← Back", callback_data=f"n:s:{day_index}:{session_index}"),
         InlineKeyboardButton("🏠 Home", callback_data="home")
     ])
 
@@ -145,7 +130,7 @@ def create_flight_view_keyboard(organized_data: dict, day_index: int, session_in
     current_video_obj = videos[current_video] if videos else None
     if current_video_obj:
         keyboard.append([
-            InlineKeyboardButton("🗑️ Delete", callback_data=f"del:ask:{day_index}:{session_index}:{flight_index}:{current_video}:{current_video_obj['id']}")
+            InlineKeyboardButton("🗑️ Delete", callback_data=f"d:a:{day_index}:{session_index}:{flight_index}:{current_video}:{current_video_obj.id}")
         ])
     
     return InlineKeyboardMarkup(keyboard)
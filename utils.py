@@ -1,58 +1,84 @@
 from datetime import datetime
+from functools import lru_cache
 import re
 import logging
 
 log = logging.getLogger(__name__)
 
+# Year token in a filename (2000-2099), compiled once for parse_filename
+_YEAR_RE = re.compile(r"20\d{2}")
+# Month/day tokens in the forms strptime's %m/%d accepted (%d also allows " 1")
+_MONTH_RE = re.compile(r"\d{1,2}", re.ASCII)
+_DAY_RE = re.compile(r"\d{1,2}| \d", re.ASCII)
+# Patterns A and B share their first nine fields (year in the fifth): one scan
+# validates the layout and captures everything; `rest` tells them apart
+_FILENAME_RE = re.compile(
+    r"(?P<f0>[^_]*)_(?P<f1>[^_]*)_(?P<f2>[^_]*)_(?P<f3>[^_]*)_(?P<year>20\d{2})_"
+    r"(?P<month>[^_]*)_(?P<day>[^_]*)_(?P<hour>[^_]*)_(?P<minute>[^_]*)(?P<rest>_.*)?",
+    re.DOTALL,
+)
+
+# Padded flight numbers for every 1-3 digit token ("7", "07", "007" -> "F007"), so the
+# common case is one dict hit instead of isdigit() plus int()
+_FLIGHT_NUMBERS = {f"{i:0{width}d}": f"F{i:03d}" for width in (1, 2, 3) for i in range(10 ** width)}
+# Camera names the iFLY recording system uses; the generic filename fallback looks for these
+KNOWN_CAMERAS = frozenset({"Door", "Centerline", "Firsttimer", "Sideline"})
+# Characters Telegram MarkdownV2 requires to be backslash-escaped
+_MD_SPECIAL_CHARS = r'_*[]()~`>#+-=|{}.!'
+_MD_ESCAPE_TABLE = str.maketrans({c: '\\' + c for c in _MD_SPECIAL_CHARS})
+
+@lru_cache(maxsize=4096)
 def parse_filename(filename: str) -> tuple:
     """
     Parse the filename to extract camera name, session and date.
     Returns: (date_timestamp, time_slot, flight_number, camera_name)
+    Results are memoized, so re-sent files skip parsing; failures are not cached.
     """
     try:
         filename = filename.replace('-', '_')
-        parts = filename.split('_')
+        match = _FILENAME_RE.fullmatch(filename)
         
         # Pattern A (legacy, 9 parts after replacement): prefix Camera Flight YYYY MM DD HH MM extra
         # Example: ifly_Door_F001_2025_08_21_14_30_001.mp4
-        if len(parts) == 9 and re.fullmatch(r"20\d{2}", parts[4]):
-            camera_name = parts[1]
-            flight_number = parts[2] if parts[2].startswith('F') else parts[3]
-            year, month, day = parts[4:7]
-            hour, minute = parts[7:9]
+        if match and match['rest'] is None:
+            camera_name = match['f1']
+            flight_number = match['f2'] if match['f2'].startswith('F') else match['f3']
+            year, month, day, hour, minute = match.group('year', 'month', 'day', 'hour', 'minute')
         # Pattern B (current long form, >=10 parts): Location Event Camera Flight YYYY MM DD HH MM SS
         # Example original: iFlyMinsk_iFLYPROEvents_Door_10_2025-08-17_21-30-33.mp4
         # After replacement: iFlyMinsk_iFLYPROEvents_Door_10_2025_08_17_21_30_33.mp4
-        elif len(parts) >= 10 and re.fullmatch(r"20\d{2}", parts[4]):
-            camera_name = parts[2]
-            raw_flight = parts[3]
+        elif match:
+            camera_name = match['f2']
+            raw_flight = match['f3']
             # Normalize flight number to F### if numeric
             if raw_flight.startswith('F'):
                 flight_number = raw_flight
             else:
                 # Pad numeric with zeros to maintain ordering, assume up to 3 digits
-                flight_number = f"F{int(raw_flight):03d}" if raw_flight.isdigit() else raw_flight
-            year, month, day = parts[4:7]
-            hour, minute = parts[7:9]
+                flight_number = _FLIGHT_NUMBERS.get(raw_flight) or (
+                    f"F{int(raw_flight):03d}" if raw_flight.isdigit() else raw_flight)
+            year, month, day, hour, minute = match.group('year', 'month', 'day', 'hour', 'minute')
         else:
             # Generic fallback: find year token anywhere
-            year_index = next((i for i,p in enumerate(parts) if re.fullmatch(r"20\d{2}", p)), None)
+            parts = filename.split('_')
+            year_index = next((i for i,p in enumerate(parts) if _YEAR_RE.fullmatch(p)), None)
             if year_index is None or year_index + 4 >= len(parts):
                 raise ValueError("Could not locate date components in filename")
             # Heuristic: camera likely immediately before flight or at index 1
             # We try to detect camera by known names
-            known_cameras = {"Door", "Centerline", "Firsttimer", "Sideline"}
-            camera_name = next((p for p in parts if p in known_cameras), parts[1])
+            camera_name = next((p for p in parts if p in KNOWN_CAMERAS), parts[1])
             # Flight number: token starting with F or numeric near camera
             flight_number = next((p for p in parts if p.startswith('F') and len(p) <= 5), None)
             if not flight_number:
                 # numeric token just before year maybe
                 cand = parts[year_index - 1] if year_index - 1 >= 0 else '1'
-                flight_number = f"F{int(cand):03d}" if cand.isdigit() else cand
+                flight_number = _FLIGHT_NUMBERS.get(cand) or (f"F{int(cand):03d}" if cand.isdigit() else cand)
             year, month, day = parts[year_index:year_index+3]
             hour, minute = parts[year_index+3:year_index+5]
 
-        date = int(datetime.strptime(f"{year}_{month}_{day}", '%Y_%m_%d').timestamp())
+        if not (_MONTH_RE.fullmatch(month) and _DAY_RE.fullmatch(day)):
+            raise ValueError(f"Invalid date {year}_{month}_{day}")
+        date = _day_timestamp(int(year), int(month), int(day))
         time_slot = get_time_slot(f"{hour}_{minute}")
         
         return date, time_slot, flight_number, camera_name
@@ -60,6 +86,12 @@ def parse_filename(filename: str) -> tuple:
         log.error(f"Error parsing filename '{filename}': {e}")
         raise
 
+@lru_cache(maxsize=1024)
+def _day_timestamp(year: int, month: int, day: int) -> int:
+    """Local midnight of the given date as a Unix timestamp (raises ValueError if invalid)."""
+    return int(datetime(year, month, day).timestamp())
+
+@lru_cache(maxsize=1024)
 def get_time_slot(input_time: str) -> str:
     """Convert time to 30-minute slots."""
     try:
@@ -75,10 +107,12 @@ def get_time_slot(input_time: str) -> str:
         log.error(f"Error getting time slot from '{input_time}': {e}")
         raise
 
+@lru_cache(maxsize=1024)
 def format_date(timestamp: int) -> str:
-    """Format timestamp to readable date."""
+    """Format timestamp to readable date (memoized: a library has few distinct flight days)."""
     return datetime.fromtimestamp(timestamp).strftime('%d.%m.%Y')
 
+@lru_cache(maxsize=1024)
 def format_flight_time(seconds: int) -> str:
     """Format flight time to readable format."""
     hours, remainder = divmod(seconds, 3600)
@@ -93,7 +127,11 @@ def format_flight_time(seconds: int) -> str:
 
 def format_days_count(days: float) -> str:
     """Format days count to readable format."""
-    days = round(days)
+    # Round before the cached lookup: the raw value is a fractional day count
+    return _format_whole_days(round(days))
+
+@lru_cache(maxsize=1024)
+def _format_whole_days(days: int) -> str:
     years, remainder = divmod(days, 365)
     months, days_remainder = divmod(remainder, 30)
     
@@ -104,7 +142,8 @@ def format_days_count(days: float) -> str:
     else:
         return f"{days_remainder} day{'s' if days_remainder != 1 else ''}"
 
+@lru_cache(maxsize=1024)
 def escape_markdown(text: str) -> str:
-    """Escape special characters for Telegram MarkdownV2."""
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', str(text))
+    """Escape special characters for Telegram MarkdownV2 (memoized: usernames,
+    dates, flight numbers and camera names repeat across renders)."""
+    return str(text).translate(_MD_ESCAPE_TABLE)